@@ -0,0 +1,22 @@
+# Gunicorn config for production deployments (pairs with nginx.conf in
+# this directory):
+#
+#   gunicorn -c backend/deploy/gunicorn.conf.py src.main:app
+#
+# gevent workers yield the worker greenlet on every blocking socket op
+# (MinIO PUT/GET, Redis, SQLAlchemy over TCP), so one slow storage
+# round-trip no longer stalls a whole sync worker — concurrency scales
+# with connections per worker instead of worker count. The gevent worker
+# monkey-patches the stdlib itself; boto3/urllib3 and redis-py are
+# cooperative once patched.
+
+bind = "127.0.0.1:5001"
+workers = 4
+worker_class = "gevent"
+worker_connections = 1000
+timeout = 120
+
+# Socket.IO falls back to long-polling under plain gevent workers;
+# install gevent-websocket and switch worker_class to
+# "geventwebsocket.gunicorn.workers.GeventWebSocketWorker" for native
+# WebSocket transport.
@@ -1,11 +1,15 @@
+import logging
 import os
+import queue
 import sys
 import uuid
 from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from flask import Flask, send_from_directory, request, jsonify
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit, join_room
 from flask_limiter import Limiter
@@ -24,6 +28,26 @@ os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
 os.environ['OAUTHLIB_RELAX_TOKEN_SCOPE'] = '1'
 os.environ['OAUTHLIB_RELAX_REDIRECT_URI'] = '1'
 
+# =====================================================
+# Logging
+# =====================================================
+# Records go through a queue drained by a background thread, so request
+# handlers never block on a synchronous stderr flush.
+_log_queue = queue.SimpleQueue()
+_log_listener = QueueListener(
+    _log_queue, logging.StreamHandler(), respect_handler_level=True
+)
+_log_listener.start()
+
+_root_logger = logging.getLogger()
+_root_logger.addHandler(QueueHandler(_log_queue))
+# The root logger defaults to WARNING, which would swallow the INFO
+# diagnostics this app logs (cleanup results, socket events); set the
+# level explicitly, overridable via LOG_LEVEL.
+_root_logger.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+
+logger = logging.getLogger(__name__)
+
 # =====================================================
 # Import DB + models
 # =====================================================
@@ -50,6 +74,34 @@ from src.routes.security import security_bp
 # =====================================================
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 
+# =====================================================
+# JSON serialization (orjson)
+# =====================================================
+# orjson serializes dicts/lists (and datetimes) several times faster than
+# the stdlib json module, which dominates CPU on the list endpoints once
+# the DB is warm. Fall back to Flask's default provider if not installed.
+try:
+    import orjson
+
+    class OrjsonProvider(JSONProvider):
+        def dumps(self, obj, **kwargs):
+            return orjson.dumps(obj).decode()
+
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+
+        def response(self, *args, **kwargs):
+            # Hand orjson's bytes straight to the response instead of
+            # decoding to str only for Flask to re-encode to UTF-8.
+            obj = self._prepare_response_obj(args, kwargs)
+            return self._app.response_class(
+                orjson.dumps(obj), mimetype='application/json'
+            )
+
+    app.json = OrjsonProvider(app)
+except ImportError:
+    pass
+
 # Database directory
 basedir = os.path.abspath(os.path.dirname(__file__))
 db_dir = os.path.join(basedir, 'database')
@@ -120,15 +172,15 @@ rooms = {}
 # =====================================================
 @socketio.on('connect')
 def handle_connect():
-    print(f"Client connected: {request.sid}")
+    logger.info(f"Client connected: {request.sid}")
 
 @socketio.on('disconnect')
 def handle_disconnect():
-    print(f"Client disconnected: {request.sid}")
+    logger.info(f"Client disconnected: {request.sid}")
     peer = connected_peers.pop(request.sid, None)
     if peer:
         room_id = peer.get("room_id")
-        print(f"Peer {request.sid} left room {room_id}")
+        logger.info(f"Peer {request.sid} left room {room_id}")
         if room_id in rooms and request.sid in rooms[room_id]:
             rooms[room_id].remove(request.sid)
             emit("peer_left", {"session_id": request.sid}, room=room_id)
@@ -153,7 +205,7 @@ def handle_join(data):
         rooms[room_id] = []
     rooms[room_id].append(request.sid)
 
-    print(f"Peer {request.sid} ({device}) joined {room_id}")
+    logger.info(f"Peer {request.sid} ({device}) joined {room_id}")
 
     other_peers = [
         connected_peers[sid]
@@ -1,3 +1,4 @@
+import logging
 import os
 import time
 import json
@@ -8,6 +9,8 @@ from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 import redis
 
+logger = logging.getLogger(__name__)
+
 # Redis connection for production rate limiting
 try:
     redis_url = os.getenv('REDIS_URL', 'redis://localhost:6379')
@@ -18,12 +21,28 @@ except:
     # Fallback to in-memory storage
     memory_store = {}
 
+# Atomic fixed-window counter: increments the bucket and arms its expiry in
+# one round-trip instead of a multi-command pipeline per check.
+RATE_LIMIT_LUA = """
+local n = redis.call('INCR', KEYS[1])
+if n == 1 then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+return n
+"""
+
 class AdvancedRateLimiter:
     """Advanced rate limiter with user-based and IP-based limits"""
-    
+
     def __init__(self):
         self.redis_available = redis_available
-        
+        self.limit_script = None
+        if redis_available:
+            try:
+                self.limit_script = redis_client.register_script(RATE_LIMIT_LUA)
+            except Exception as e:
+                logger.warning(f"Redis script registration failed: {e}")
+
     def get_key(self, identifier, endpoint):
         """Generate cache key for rate limiting"""
         return f"rate_limit:{identifier}:{endpoint}"
@@ -41,30 +60,14 @@ class AdvancedRateLimiter:
         current_time = int(time.time())
         window_start = current_time - window_seconds
         
-        if self.redis_available:
+        if self.redis_available and self.limit_script is not None:
             try:
-                # Use Redis for production
-                pipe = redis_client.pipeline()
-                
-                # Remove old entries
-                pipe.zremrangebyscore(key, 0, window_start)
-                
-                # Count current requests
-                pipe.zcard(key)
-                
-                # Add current request
-                pipe.zadd(key, {str(current_time): current_time})
-                
-                # Set expiry
-                pipe.expire(key, window_seconds)
-                
-                results = pipe.execute()
-                current_count = results[1]
-                
-                return current_count < limit, current_count
-                
+                # Single atomic INCR+EXPIRE via Lua (one round-trip)
+                current_count = self.limit_script(keys=[key], args=[window_seconds])
+                return current_count <= limit, current_count
+
             except Exception as e:
-                print(f"Redis error: {e}")
+                logger.warning(f"Redis error: {e}")
                 # Fallback to memory store
                 pass
         
@@ -192,3 +195,30 @@ def strict_rate_limit(f):
         'anonymous': {'limit': 20, 'window': 600}  # 2 requests per 10 minutes for anonymous //temp i will change it back to 2
     })(f)
 
+def file_password_rate_limit(f):
+    """Per-(IP, file) limit for password verification attempts.
+
+    The per-IP limits above share one budget across all files, so an
+    attacker probing many files gets the full budget on each. Keying on
+    (ip, file_id) caps attempts per file and skips the KDF entirely for
+    rejected requests.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        file_id = kwargs.get('file_id', '')
+        ip_address = get_remote_address()
+        key = f"rate_limit:pwverify:{ip_address}:{file_id}"
+
+        allowed, count = advanced_limiter.check_rate_limit(key, 5, 60)
+        if not allowed:
+            return jsonify({
+                'error': 'Too many password attempts for this file',
+                'limit': 5,
+                'window': 60,
+                'current_count': count
+            }), 429
+
+        return f(*args, **kwargs)
+
+    return decorated_function
+
@@ -2,6 +2,7 @@ from .database import db
 from .user import User
 from .file import File
 from .download import Download
+from .deletion_queue import DeletionQueue
 
-__all__ = ['db', 'User', 'File', 'Download']
+__all__ = ['db', 'User', 'File', 'Download', 'DeletionQueue']
 
@@ -0,0 +1,25 @@
+from datetime import datetime
+from .database import db
+
+class DeletionQueue(db.Model):
+    """Tombstones for storage objects awaiting deletion.
+
+    The expiry sweep enqueues keys inside its own DB transaction so the
+    commit never waits on a storage round-trip; a scheduled drain job
+    deletes the objects in batches and removes rows only on success,
+    which makes failed deletes retryable instead of silently leaked.
+    """
+
+    __tablename__ = 'deletion_queue'
+
+    # The drain job pulls oldest-first
+    __table_args__ = (
+        db.Index('ix_deletion_queue_requested', 'requested_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    storage_key = db.Column(db.String(500), nullable=False)
+    requested_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<DeletionQueue {self.storage_key}>'
@@ -5,7 +5,14 @@ class Download(db.Model):
     """Download model for tracking file downloads"""
     
     __tablename__ = 'downloads'
-    
+
+    # Per-file download history and stats filter on (file_id, created_at);
+    # the retention sweep deletes by created_at alone
+    __table_args__ = (
+        db.Index('ix_downloads_file_created', 'file_id', 'created_at'),
+        db.Index('ix_downloads_created', 'created_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     file_id = db.Column(db.String(36), db.ForeignKey('files.id'), nullable=False)
     user_id = db.Column(db.String(255), db.ForeignKey('users.id'), nullable=True)  # Nullable for anonymous downloads
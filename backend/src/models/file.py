@@ -2,12 +2,24 @@ from datetime import datetime, timedelta
 from .database import db
 import uuid
 import hashlib
+import hmac
+
+import bcrypt
+from werkzeug.security import check_password_hash
 
 class File(db.Model):
     """File model for storing file metadata"""
     
     __tablename__ = 'files'
-    
+
+    # Composite indexes matching the hot filters: per-user listings
+    # ordered by created_at, and the expiry sweep over active files.
+    __table_args__ = (
+        db.Index('ix_files_user_active_created', 'user_id', 'is_deleted', 'created_at'),
+        db.Index('ix_files_expires_active', 'expires_at', 'is_deleted'),
+        db.Index('ix_files_storage_key', 'storage_key'),
+    )
+
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = db.Column(db.String(255), db.ForeignKey('users.id'), nullable=True)
     
@@ -98,19 +110,33 @@ class File(db.Model):
     def set_password(self, password):
         """Set password protection for file"""
         if password:
-            self.password_hash = hashlib.sha256(password.encode()).hexdigest()
+            # Same bcrypt parameters as the password routes' helper
+            self.password_hash = bcrypt.hashpw(
+                password.encode(), bcrypt.gensalt(rounds=12)
+            ).decode()
         else:
             self.password_hash = None
-    
+
     def check_password(self, password):
         """Check if provided password is correct"""
         if not self.password_hash:
             return True  # No password protection
-        
+
         if not password:
             return False
-        
-        return self.password_hash == hashlib.sha256(password.encode()).hexdigest()
+
+        if self.password_hash.startswith('$2'):
+            try:
+                return bcrypt.checkpw(password.encode(), self.password_hash.encode())
+            except ValueError:
+                return False
+        if self.password_hash.startswith('pbkdf2:'):
+            return check_password_hash(self.password_hash, password)
+        # Rows written before the KDF switch hold a bare sha256 hex digest
+        return hmac.compare_digest(
+            self.password_hash,
+            hashlib.sha256(password.encode()).hexdigest()
+        )
     
     def increment_download_count(self):
         """Increment download counter"""
@@ -30,8 +30,38 @@ def get_user_dashboard():
                                 .limit(5)\
                                 .all()
         
-        # Get download history
-        recent_downloads = Download.get_user_download_history(user_id, limit=10)
+        # Get download history (column projection — skip ORM instance
+        # construction for this one-shot read)
+        recent_download_rows = db.session.query(
+            Download.id,
+            Download.file_id,
+            Download.user_id,
+            Download.ip_address,
+            Download.user_agent,
+            Download.country,
+            Download.city,
+            Download.download_status,
+            Download.bytes_downloaded,
+            Download.created_at,
+            Download.completed_at
+        ).filter_by(user_id=user_id)\
+         .order_by(Download.created_at.desc())\
+         .limit(10)\
+         .all()
+
+        recent_downloads = [{
+            'id': r.id,
+            'file_id': r.file_id,
+            'user_id': r.user_id,
+            'ip_address': r.ip_address,
+            'user_agent': r.user_agent,
+            'country': r.country,
+            'city': r.city,
+            'download_status': r.download_status,
+            'bytes_downloaded': r.bytes_downloaded,
+            'created_at': r.created_at.isoformat() if r.created_at else None,
+            'completed_at': r.completed_at.isoformat() if r.completed_at else None
+        } for r in recent_download_rows]
         
         # Get popular files
         popular_files_data = db.session.query(
@@ -75,7 +105,7 @@ def get_user_dashboard():
             'user_info': user.to_dict(),
             'upload_stats': upload_stats,
             'recent_files': [f.to_dict() for f in recent_files],
-            'recent_downloads': [d.to_dict() for d in recent_downloads],
+            'recent_downloads': recent_downloads,
             'popular_files': popular_files,
             'weekly_trend': list(reversed(weekly_trend))
         })
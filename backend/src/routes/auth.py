@@ -1,4 +1,5 @@
 import os
+import logging
 import json
 from datetime import datetime, timedelta, timezone
 from flask import Blueprint, request, jsonify, session, redirect, url_for
@@ -7,6 +8,8 @@ from authlib.common.errors import AuthlibBaseError
 import requests
 from ..middleware.rate_limiter import api_rate_limit, strict_rate_limit
 
+logger = logging.getLogger(__name__)
+
 auth_bp = Blueprint('auth', __name__)
 
 # Google OAuth configuration
@@ -65,9 +68,7 @@ def callback():
             resp = google.get('https://www.googleapis.com/oauth2/v2/userinfo')
             user_info = resp.json()
         
-        print("--- USER INFO FROM GOOGLE --- ")
-        print(user_info)
-        print("-------------------------")
+        logger.debug("User info from Google: %s", user_info)
         
         # Create or update user - handle both 'id' and 'sub' fields
         user_id = user_info.get('id') or user_info.get('sub')
@@ -76,7 +77,7 @@ def callback():
         picture = user_info.get('picture')
         
         if not user_id or not email:
-            print(f"Missing required fields: user_id={user_id}, email={email}")
+            logger.warning(f"Missing required fields: user_id={user_id}, email={email}")
             return jsonify({'error': 'Invalid user information from Google'}), 400
         
         # Store user in database
@@ -1,15 +1,19 @@
+import logging
 import os
 import schedule
 import time
 import threading
 from datetime import datetime, timedelta
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, current_app, jsonify, request
+from sqlalchemy.orm import load_only
 
 from ..models.database import db
 from ..models import File, Download
 from .auth import require_auth
 from ..middleware.rate_limiter import api_rate_limit
 
+logger = logging.getLogger(__name__)
+
 cleanup_bp = Blueprint('cleanup', __name__)
 
 # Global cleanup scheduler
@@ -19,42 +23,38 @@ cleanup_thread = None
 def cleanup_expired_files():
     """Clean up expired files from database and storage"""
     try:
-        print(f"[{datetime.utcnow()}] Starting cleanup job...")
+        logger.info("Starting cleanup job...")
         
         # Get expired files
         expired_files = File.get_expired_files()
         
         if not expired_files:
-            print("No expired files to clean up")
+            logger.info("No expired files to clean up")
             return
         
-        cleaned_count = 0
-        storage_cleaned = 0
-        
         from ..services.minio_client import minio_client
-        
+
+        # One DeleteObjects round-trip per 1000 keys instead of one
+        # per file
+        delete_result = minio_client.delete_files(
+            f.storage_key for f in expired_files
+        )
+        storage_cleaned = len(delete_result['deleted'])
+        for err in delete_result['errors']:
+            # Log failures but still mark rows deleted below to prevent
+            # repeated attempts
+            logger.error(f"Error deleting from MinIO {err.get('Key')}: {err.get('Message')}")
+
+        # Mark everything deleted in one flush/commit rather than a
+        # commit per row
+        now = datetime.utcnow()
         for file_record in expired_files:
-            try:
-                # Delete from MinIO storage
-                delete_result = minio_client.delete_file(file_record.storage_key)
-                
-                if delete_result['success']:
-                    storage_cleaned += 1
-                    # Mark file as deleted in database
-                    file_record.mark_deleted()
-                    cleaned_count += 1
-                else:
-                    # If MinIO deletion fails, log it but still mark as deleted in DB to prevent repeated attempts
-                    print(f"Error deleting from MinIO {file_record.storage_key}: {delete_result['error']}")
-                    file_record.mark_deleted() # Mark as deleted to stop repeated attempts
-                    cleaned_count += 1
-                
-                print(f"Cleaned up file: {file_record.original_name} (ID: {file_record.id})")
-                
-            except Exception as e:
-                print(f"Error cleaning up file {file_record.id}: {e}")
-        
-        print(f"Cleanup completed: {cleaned_count} files marked as deleted, {storage_cleaned} files removed from storage")
+            file_record.is_deleted = True
+            file_record.deleted_at = now
+        db.session.commit()
+        cleaned_count = len(expired_files)
+
+        logger.info(f"Cleanup completed: {cleaned_count} files marked as deleted, {storage_cleaned} files removed from storage")
         
         # Clean up old download records (older than 30 days)
         cutoff_date = datetime.utcnow() - timedelta(days=30)
@@ -64,17 +64,17 @@ def cleanup_expired_files():
             db.session.delete(download)
         
         db.session.commit()
-        print(f"Cleaned up {len(old_downloads)} old download records")
+        logger.info(f"Cleaned up {len(old_downloads)} old download records")
         
     except Exception as e:
-        print(f"Cleanup job failed: {e}")
+        logger.error(f"Cleanup job failed: {e}")
 
 def start_cleanup_scheduler():
     """Start the background cleanup scheduler"""
     global cleanup_scheduler, cleanup_thread
     
     if cleanup_thread and cleanup_thread.is_alive():
-        print("Cleanup scheduler already running")
+        logger.info("Cleanup scheduler already running")
         return
     
     # Schedule cleanup every hour
@@ -91,7 +91,7 @@ def start_cleanup_scheduler():
     cleanup_thread = threading.Thread(target=run_scheduler, daemon=True)
     cleanup_thread.start()
     
-    print("Cleanup scheduler started")
+    logger.info("Cleanup scheduler started")
 
 def stop_cleanup_scheduler():
     """Stop the background cleanup scheduler"""
@@ -102,7 +102,7 @@ def stop_cleanup_scheduler():
     if cleanup_thread:
         cleanup_thread = None
     
-    print("Cleanup scheduler stopped")
+    logger.info("Cleanup scheduler stopped")
 
 @cleanup_bp.route('/cleanup/run', methods=['POST'])
 @require_auth
@@ -112,13 +112,21 @@ def manual_cleanup():
     try:
         # Check if user is admin (you can implement admin check here)
         # For now, any authenticated user can trigger cleanup
-        
-        cleanup_expired_files()
-        
+
+        # Run in the background — the caller shouldn't wait out the
+        # storage deletes
+        app = current_app._get_current_object()
+
+        def _run():
+            with app.app_context():
+                cleanup_expired_files()
+
+        threading.Thread(target=_run, daemon=True).start()
+
         return jsonify({
-            'message': 'Cleanup completed successfully',
+            'message': 'Cleanup started',
             'timestamp': datetime.utcnow().isoformat()
-        })
+        }), 202
         
     except Exception as e:
         return jsonify({'error': f'Cleanup failed: {str(e)}'}), 500
@@ -199,8 +207,11 @@ def configure_cleanup_schedule():
 def force_delete_file(file_id):
     """Force delete a specific file (admin only)"""
     try:
-        file_record = File.query.filter_by(id=file_id).first()
-        
+        # Only the columns the delete path needs
+        file_record = File.query.options(
+            load_only(File.id, File.user_id, File.storage_key)
+        ).filter_by(id=file_id).first()
+
         if not file_record:
             return jsonify({'error': 'File not found'}), 404
         
@@ -215,11 +226,16 @@ def force_delete_file(file_id):
         
         if not delete_result['success']:
             # Log error but proceed to mark as deleted in DB to prevent repeated attempts
-            print(f"Error deleting from MinIO {file_record.storage_key}: {delete_result['error']}")
+            logger.error(f"Error deleting from MinIO {file_record.storage_key}: {delete_result['error']}")
         
         # Mark as deleted in database regardless of MinIO result
         file_record.mark_deleted()
-        
+
+        # Route cached file listings to fresh keys
+        from .files import bump_user_files_version
+        bump_user_files_version(file_record.user_id)
+
+
         return jsonify({
             'message': 'File deleted successfully',
             'file_id': file_id
@@ -268,5 +284,5 @@ def cleanup_stats():
 def init_cleanup_scheduler():
     """Initialize the cleanup scheduler"""
     start_cleanup_scheduler()
-    print("Cleanup system initialized")
+    logger.info("Cleanup system initialized")
 
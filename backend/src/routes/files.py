@@ -1,25 +1,134 @@
+import logging
 import os
 import io
+import re
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, urlsplit
+
 import qrcode
+
+# Optional: the pure-python PNG factory writes 1-bit scanlines straight
+# from the QR matrix, skipping the full PIL image round-trip. Needs the
+# pypng extra; fall back to the default PIL factory without it.
+try:
+    from qrcode.image.pure import PyPNGImage
+except ImportError:
+    PyPNGImage = None
+
 from datetime import datetime, timedelta
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, Response, current_app, request, jsonify, send_file
 import magic
+import redis
 from PIL import Image
+from sqlalchemy import bindparam, select
+
+# Optional: libvips fuses JPEG decode and shrink in one pass and is several
+# times faster than Pillow's Lanczos loop. Fall back to Pillow when absent.
+try:
+    import pyvips
+except ImportError:
+    pyvips = None
 
 from ..models.database import db
 from ..models import User, File, Download
 from .auth import require_auth
+from .password import verify_file_access_token
 from ..middleware.rate_limiter import upload_rate_limit, download_rate_limit, api_rate_limit
 from ..services.minio_client import minio_client
 
+logger = logging.getLogger(__name__)
+
 # 🔥 IMPORTANT: Add url_prefix so routes become /api/files/...
 files_bp = Blueprint('files', __name__, url_prefix="/api")
 
+# Small pool so the SigV4 presign (pure HMAC CPU) can overlap with the
+# download-count DB writes instead of running after them.
+_presign_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='presign')
+
+# When the app sits behind the nginx config in backend/deploy, downloads
+# can skip the presigned-URL round-trip: X-Accel-Redirect hands the
+# transfer to nginx's internal MinIO proxy (kernel-level sendfile path).
+_USE_X_ACCEL = os.getenv('DOWNLOAD_X_ACCEL', '').lower() in ('1', 'true', 'yes')
+
+# Short-TTL cache for per-user file listings. A version counter bumped on
+# upload/delete is part of the cache key, so invalidation is one INCR and
+# stale pages simply age out of Redis.
+_FILES_CACHE_TTL = 30
+
+try:
+    _redis = redis.from_url(
+        os.getenv('REDIS_URL', 'redis://localhost:6379'),
+        decode_responses=True
+    )
+except Exception:
+    _redis = None
+
+def bump_user_files_version(user_id):
+    """Invalidate cached file listings for a user (call after upload/delete)"""
+    if _redis is None or not user_id:
+        return
+    try:
+        _redis.incr(f"files_ver:{user_id}")
+    except Exception as e:
+        logger.warning(f"Redis error: {e}")
+
+# File ids are uuid4 strings — anything else can be rejected before
+# touching the database.
+_UUID_RE = re.compile(
+    r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$'
+)
+
+# Rendered QR PNGs keyed by share URL: the image is deterministic, so
+# each worker pays the render+encode once per file instead of per view.
+_QR_CACHE_MAX = 1024
+_qr_cache = OrderedDict()
+
+# Presigned GET URLs are valid for an hour; caching them per storage key
+# for 50 minutes means a viral share link is signed once per window
+# instead of once per download, while cached URLs always keep at least
+# ten minutes of validity.
+_PRESIGN_TTL = 3000
+_PRESIGN_CACHE_MAX = 10000
+_presign_cache = OrderedDict()
+
+
+def _presigned_download_url(storage_key):
+    now = time.monotonic()
+    entry = _presign_cache.get(storage_key)
+    if entry is not None and entry[0] > now:
+        _presign_cache.move_to_end(storage_key)
+        return entry[1]
+
+    url = minio_client.generate_presigned_url(
+        "get_object",
+        Params={"Bucket": minio_client.bucket_name, "Key": storage_key},
+        ExpiresIn=3600
+    )
+    _presign_cache[storage_key] = (now + _PRESIGN_TTL, url)
+    while len(_presign_cache) > _PRESIGN_CACHE_MAX:
+        _presign_cache.popitem(last=False)
+    return url
+
 
 # File type detection
+# Reuse a single libmagic cookie: magic.from_buffer() loads the magic
+# database on every call, which costs ~ms per upload.
+try:
+    _MAGIC = magic.Magic(mime=True)
+except Exception:
+    _MAGIC = None
+
+
 def get_file_type(file_content):
     try:
-        return magic.from_buffer(file_content, mime=True)
+        # libmagic signatures only look at the head of the file, so avoid
+        # pushing multi-MB buffers across the FFI boundary.
+        head = file_content[:4096]
+        if _MAGIC is not None:
+            return _MAGIC.from_buffer(head)
+        return magic.from_buffer(head, mime=True)
     except:
         return 'application/octet-stream'
 
@@ -27,8 +136,24 @@ def get_file_type(file_content):
 def generate_thumbnail(file_content, file_type):
     if not file_type.startswith('image/'):
         return None
+
+    if pyvips is not None:
+        try:
+            thumb = pyvips.Image.thumbnail_buffer(file_content, 200, height=200)
+            if thumb.hasalpha():
+                thumb = thumb.flatten(background=[255, 255, 255])
+            return thumb.write_to_buffer('.jpg[Q=85]')
+        except Exception:
+            logger.exception("pyvips thumbnail failed, falling back to Pillow")
+
     try:
         image = Image.open(io.BytesIO(file_content))
+
+        # For JPEGs, let libjpeg scale down during decode (1/2, 1/4, 1/8)
+        # so the Lanczos pass only sees a near-target-size image.
+        if image.format == 'JPEG':
+            image.draft('RGB', (200, 200))
+
         image.thumbnail((200, 200), Image.Resampling.LANCZOS)
 
         if image.mode in ('RGBA', 'LA', 'P'):
@@ -41,11 +166,63 @@ def generate_thumbnail(file_content, file_type):
         thumb_io = io.BytesIO()
         image.save(thumb_io, format='JPEG', quality=85)
         return thumb_io.getvalue()
-    except Exception as e:
-        print("Thumbnail generation failed:", e)
+    except Exception:
+        logger.exception("Thumbnail generation failed")
         return None
 
 
+def generate_thumbnails_batch(items):
+    """
+    Generate thumbnails for a batch of files (migration / re-encode jobs).
+
+    items: iterable of (file_content, file_type) tuples.
+    Returns JPEG bytes (or None) per item, in order. Going through one
+    helper keeps the decode+shrink pipeline (draft / pyvips) hot instead
+    of re-deriving it per caller.
+    """
+    return [generate_thumbnail(content, file_type) for content, file_type in items]
+
+
+# Built once at import: the Core expression tree for the hottest lookup
+# in the app. Executing a prebuilt statement with bound parameters skips
+# re-constructing the query object per request and always hits
+# SQLAlchemy's compiled-SQL cache.
+_ACTIVE_FILE_STMT = (
+    select(File)
+    .where(
+        File.id == bindparam('id'),
+        File.is_deleted == False,
+        File.expires_at > bindparam('now'),
+    )
+    .limit(1)
+)
+
+
+def _active_file(file_id):
+    """Fetch a live (non-deleted, non-expired) file in one query.
+
+    Expiry is part of the SQL filter, so expired rows are skipped by the
+    database and never hydrated into ORM objects.
+    """
+    return db.session.execute(
+        _ACTIVE_FILE_STMT, {'id': file_id, 'now': datetime.utcnow()}
+    ).scalar_one_or_none()
+
+
+def _missing_file_response(file_id):
+    """404 vs 410 for a file _active_file didn't return.
+
+    Only runs on the error path: one cheap column probe tells an expired
+    file apart from an unknown one so clients keep the 410 distinction.
+    """
+    exists = db.session.query(File.id).filter(
+        File.id == file_id, File.is_deleted == False
+    ).scalar()
+    if exists:
+        return jsonify({'error': 'File has expired'}), 410
+    return jsonify({'error': 'File not found'}), 404
+
+
 # ============================================================
 #  GET FILE INFO (used by DownloadPage.jsx)
 # ============================================================
@@ -57,13 +234,15 @@ def public_share_info(file_id):
     Returns basic file info without requiring authentication.
     """
     try:
-        file_record = File.query.filter_by(id=file_id, is_deleted=False).first()
-
-        if not file_record:
+        # Crawlers probe /share/<id> with junk ids constantly; anything
+        # that isn't uuid-shaped can 404 without a DB round-trip.
+        if not _UUID_RE.match(file_id):
             return jsonify({'error': 'File not found'}), 404
 
-        if file_record.is_expired():
-            return jsonify({'error': 'File has expired'}), 410
+        file_record = _active_file(file_id)
+
+        if not file_record:
+            return _missing_file_response(file_id)
 
         # What DownloadPage.jsx expects:
         return jsonify({
@@ -81,13 +260,13 @@ def public_share_info(file_id):
 @download_rate_limit
 def get_file_info(file_id):
     try:
-        file_record = File.query.filter_by(id=file_id, is_deleted=False).first()
-
-        if not file_record:
+        if not _UUID_RE.match(file_id):
             return jsonify({'error': 'File not found'}), 404
 
-        if file_record.is_expired():
-            return jsonify({'error': 'File has expired'}), 410
+        file_record = _active_file(file_id)
+
+        if not file_record:
+            return _missing_file_response(file_id)
 
         if not file_record.can_download():
             return jsonify({'error': 'File cannot be downloaded'}), 403
@@ -107,7 +286,10 @@ def get_file_info(file_id):
             "file_icon": file_record.get_file_icon()
         })
 
-        return jsonify(file_data)
+        resp = jsonify(file_data)
+        resp.headers['Cache-Control'] = 'public, max-age=60, stale-while-revalidate=300'
+        resp.add_etag()
+        return resp.make_conditional(request)
 
     except Exception as e:
         return jsonify({"error": f"Server error: {str(e)}"}), 500
@@ -120,28 +302,54 @@ def get_file_info(file_id):
 @api_rate_limit
 def generate_qr_code(file_id):
     try:
+        # Public, spammable endpoint: reject malformed ids before any
+        # DB or PIL work.
+        if not _UUID_RE.match(file_id):
+            return jsonify({'error': 'File not found'}), 404
+
+        # QR content only depends on the file id, so a matching ETag can be
+        # answered before touching the DB or re-rendering the PNG.
+        qr_etag = f"qr-{file_id}"
+        if request.if_none_match.contains(qr_etag):
+            return '', 304
+
         file_record = File.query.filter_by(id=file_id, is_deleted=False).first()
 
         if not file_record:
             return jsonify({'error': 'File not found'}), 404
 
-        # Generate QR to share link
+        # Generate QR to share link (the URL is the cache key since the
+        # image depends on the host the request came through)
         full_share_url = request.host_url.rstrip("/") + f"/share/{file_id}"
 
-        qr = qrcode.QRCode(
-            version=1, error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10, border=4,
-        )
-        qr.add_data(full_share_url)
-        qr.make(fit=True)
-
-        img = qr.make_image(fill_color="black", back_color="white")
-
-        img_io = io.BytesIO()
-        img.save(img_io, "PNG")
-        img_io.seek(0)
-
-        return send_file(img_io, mimetype='image/png')
+        png_bytes = _qr_cache.get(full_share_url)
+        if png_bytes is None:
+            qr = qrcode.QRCode(
+                version=1, error_correction=qrcode.constants.ERROR_CORRECT_L,
+                box_size=10, border=4,
+                image_factory=PyPNGImage,  # None -> default PIL factory
+            )
+            qr.add_data(full_share_url)
+            qr.make(fit=True)
+
+            img_io = io.BytesIO()
+            if PyPNGImage is not None:
+                qr.make_image().save(img_io)
+            else:
+                img = qr.make_image(fill_color="black", back_color="white")
+                img.save(img_io, "PNG")
+            png_bytes = img_io.getvalue()
+
+            _qr_cache[full_share_url] = png_bytes
+            while len(_qr_cache) > _QR_CACHE_MAX:
+                _qr_cache.popitem(last=False)
+        else:
+            _qr_cache.move_to_end(full_share_url)
+
+        resp = send_file(io.BytesIO(png_bytes), mimetype='image/png')
+        resp.headers['Cache-Control'] = 'public, max-age=86400, immutable'
+        resp.set_etag(qr_etag)
+        return resp
 
     except Exception as e:
         return jsonify({"error": f"QR code generation failed: {str(e)}"}), 500
@@ -154,22 +362,25 @@ def generate_qr_code(file_id):
 @download_rate_limit
 def download_file(file_id):
     try:
-        file_record = File.query.filter_by(id=file_id, is_deleted=False).first()
-
-        if not file_record:
+        if not _UUID_RE.match(file_id):
             return jsonify({'error': 'File not found'}), 404
 
-        if file_record.is_expired():
-            return jsonify({'error': 'File has expired'}), 410
+        file_record = _active_file(file_id)
+
+        if not file_record:
+            return _missing_file_response(file_id)
 
         if not file_record.can_download():
             return jsonify({'error': 'Download limit exceeded'}), 403
 
         data = request.get_json() or {}
         password = data.get('password')
+        access_token = data.get('access_token')
 
-        if not file_record.check_password(password):
-            return jsonify({'error': 'Invalid password'}), 401
+        # A token from a prior verify-password call skips the hash check
+        if not verify_file_access_token(file_id, access_token):
+            if not file_record.check_password(password):
+                return jsonify({'error': 'Invalid password'}), 401
 
         user_id = getattr(request, 'current_user_id', None)
         request_data = {
@@ -183,15 +394,35 @@ def download_file(file_id):
             request_data=request_data
         )
 
-        presigned_url = minio_client.generate_presigned_url(
-            "get_object",
-            Params={"Bucket": minio_client.bucket_name, "Key": file_record.storage_key},
-            ExpiresIn=3600
+        if _USE_X_ACCEL:
+            # One round-trip: nginx streams the object itself via its
+            # internal proxy location instead of the client following a
+            # presigned URL. The redirect carries the presigned path and
+            # query (/{bucket}/{key}?X-Amz-...), so MinIO authenticates
+            # the internal fetch via the SigV4 query string — no
+            # anonymous-read bucket policy needed.
+            file_record.increment_download_count()
+            download_record.mark_completed()
+
+            presigned = urlsplit(_presigned_download_url(file_record.storage_key))
+            resp = Response(status=200)
+            resp.headers['X-Accel-Redirect'] = (
+                f"/internal-minio{presigned.path}?{presigned.query}"
+            )
+            resp.headers['Content-Disposition'] = (
+                f"attachment; filename*=UTF-8''{quote(file_record.original_name)}"
+            )
+            return resp
+
+        presign_future = _presign_pool.submit(
+            _presigned_download_url, file_record.storage_key
         )
 
         file_record.increment_download_count()
         download_record.mark_completed()
 
+        presigned_url = presign_future.result()
+
         return jsonify({
             "download_url": presigned_url,
             "file_name": file_record.original_name,
@@ -209,18 +440,21 @@ def download_file(file_id):
 @api_rate_limit
 def preview_file(file_id):
     try:
-        file_record = File.query.filter_by(id=file_id, is_deleted=False).first()
-
-        if not file_record:
+        if not _UUID_RE.match(file_id):
             return jsonify({'error': 'File not found'}), 404
 
-        if file_record.is_expired():
-            return jsonify({'error': 'File has expired'}), 410
+        file_record = _active_file(file_id)
 
-        return jsonify({
+        if not file_record:
+            return _missing_file_response(file_id)
+
+        resp = jsonify({
             "preview_available": file_record.file_type.startswith("image/"),
             "file_info": file_record.to_dict()
         })
+        resp.headers['Cache-Control'] = 'public, max-age=60, stale-while-revalidate=300'
+        resp.add_etag()
+        return resp.make_conditional(request)
 
     except Exception as e:
         return jsonify({"error": f"Preview failed: {str(e)}"}), 500
@@ -237,6 +471,20 @@ def get_user_files():
         page = request.args.get('page', 1, type=int)
         per_page = min(request.args.get('per_page', 20, type=int), 100)
 
+        # Serve repeat listings from Redis; the user's version counter in
+        # the key means an upload/delete immediately routes to fresh keys
+        cache_key = None
+        if _redis is not None:
+            try:
+                ver = _redis.get(f"files_ver:{request.current_user_id}") or '0'
+                cache_key = f"files:{request.current_user_id}:{ver}:{page}:{per_page}"
+                cached = _redis.get(cache_key)
+                if cached is not None:
+                    return Response(cached, mimetype='application/json')
+            except Exception as e:
+                logger.warning(f"Redis error: {e}")
+                cache_key = None
+
         files_query = File.query.filter_by(
             user_id=request.current_user_id,
             is_deleted=False
@@ -252,7 +500,7 @@ def get_user_files():
             d['download_stats'] = Download.get_file_download_stats(file_record.id)
             files_data.append(d)
 
-        return jsonify({
+        payload = {
             "files": files_data,
             "pagination": {
                 "page": page,
@@ -260,7 +508,17 @@ def get_user_files():
                 "total": files_paginated.total,
                 "pages": files_paginated.pages
             }
-        })
+        }
+
+        if cache_key is not None:
+            try:
+                _redis.setex(
+                    cache_key, _FILES_CACHE_TTL, current_app.json.dumps(payload)
+                )
+            except Exception as e:
+                logger.warning(f"Redis error: {e}")
+
+        return jsonify(payload)
 
     except Exception as e:
         return jsonify({"error": f"Files retrieval failed: {str(e)}"}), 500
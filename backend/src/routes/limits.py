@@ -1,6 +1,6 @@
 from flask import Blueprint, jsonify, request
 from datetime import datetime, timedelta
-from sqlalchemy import func
+from sqlalchemy import case, func
 
 from ..models.database import db
 from ..models import File, User
@@ -75,33 +75,25 @@ def check_file_count_limit(user_id):
 def get_user_usage_stats(user_id):
     """Get detailed usage statistics for a user"""
     limits = get_user_limits(user_id)
-    
-    # Storage usage
-    total_storage = db.session.query(func.sum(File.file_size)).filter(
-        File.user_id == user_id,
-        File.is_deleted == False
-    ).scalar() or 0
-    
-    # File count
-    file_count = File.query.filter(
-        File.user_id == user_id,
-        File.is_deleted == False
-    ).count()
-    
-    # Daily uploads
+
+    # All four aggregates in one index-range scan over the user's active
+    # files instead of four separate queries
     yesterday = datetime.utcnow() - timedelta(days=1)
-    daily_uploads = File.query.filter(
-        File.user_id == user_id,
-        File.created_at >= yesterday,
-        File.is_deleted == False
-    ).count()
-    
-    # Total downloads (across all user's files)
-    total_downloads = db.session.query(func.sum(File.download_count)).filter(
+    stats = db.session.query(
+        func.count(File.id).label('file_count'),
+        func.sum(File.file_size).label('total_storage'),
+        func.sum(File.download_count).label('total_downloads'),
+        func.sum(case((File.created_at >= yesterday, 1), else_=0)).label('daily_uploads')
+    ).filter(
         File.user_id == user_id,
         File.is_deleted == False
-    ).scalar() or 0
-    
+    ).first()
+
+    file_count = stats.file_count or 0
+    total_storage = stats.total_storage or 0
+    total_downloads = stats.total_downloads or 0
+    daily_uploads = stats.daily_uploads or 0
+
     return {
         'storage': {
             'used': total_storage,
@@ -265,24 +257,22 @@ def reset_user_limits():
 def get_global_stats():
     """Get global platform statistics"""
     try:
-        # Total files
-        total_files = File.query.filter_by(is_deleted=False).count()
-        
-        # Total storage
-        total_storage = db.session.query(func.sum(File.file_size)).filter_by(is_deleted=False).scalar() or 0
-        
-        # Total downloads
-        total_downloads = db.session.query(func.sum(File.download_count)).filter_by(is_deleted=False).scalar() or 0
-        
-        # Active users (users with at least one file)
-        active_users = db.session.query(func.count(func.distinct(File.user_id))).filter_by(is_deleted=False).scalar() or 0
-        
-        # Files uploaded today
         today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        files_today = File.query.filter(
-            File.created_at >= today,
-            File.is_deleted == False
-        ).count()
+
+        # All aggregates in a single scan instead of five separate queries
+        stats = db.session.query(
+            func.count(File.id).label('total_files'),
+            func.sum(File.file_size).label('total_storage'),
+            func.sum(File.download_count).label('total_downloads'),
+            func.count(func.distinct(File.user_id)).label('active_users'),
+            func.sum(case((File.created_at >= today, 1), else_=0)).label('files_today')
+        ).filter(File.is_deleted == False).first()
+
+        total_files = stats.total_files or 0
+        total_storage = stats.total_storage or 0
+        total_downloads = stats.total_downloads or 0
+        active_users = stats.active_users or 0
+        files_today = stats.files_today or 0
         
         return jsonify({
             'total_files': total_files,
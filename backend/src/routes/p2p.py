@@ -1,20 +1,153 @@
 from flask import Blueprint, request, jsonify
 from flask_socketio import emit, join_room, leave_room, rooms
+import json
+import logging
+import os
+import secrets
+import time
 import uuid
+from collections import deque
 from datetime import datetime
 
+import redis
+
 from ..middleware.rate_limiter import api_rate_limit
 
+logger = logging.getLogger(__name__)
+
 p2p_bp = Blueprint('p2p', __name__)
 
-# Store active P2P sessions
+# P2P session storage. Sessions live in a Redis hash (plus a sorted set of
+# join timestamps) so every gunicorn worker sees the same peer list; the
+# module dicts below are only the fallback when Redis is unreachable.
+SESSIONS_KEY = 'p2p:sessions'
+JOINED_KEY = 'p2p:joined'
+VERSION_KEY = 'p2p:version'
+SESSION_TTL = 24 * 3600
+
+try:
+    _redis = redis.from_url(
+        os.getenv('REDIS_URL', 'redis://localhost:6379'),
+        decode_responses=True
+    )
+except Exception:
+    _redis = None
+
+# In-process fallback (single-worker dev runs without Redis)
 active_sessions = {}
 peer_connections = {}
 
+def _store_session(session_id, session_info):
+    """Persist a session so all workers can see it"""
+    if _redis is not None:
+        try:
+            pipe = _redis.pipeline()
+            pipe.hset(SESSIONS_KEY, session_id, json.dumps(session_info))
+            pipe.zadd(JOINED_KEY, {session_id: session_info['joined_epoch']})
+            pipe.expire(SESSIONS_KEY, SESSION_TTL)
+            pipe.expire(JOINED_KEY, SESSION_TTL)
+            pipe.execute()
+            _bump_peer_version()
+            return
+        except Exception as e:
+            logger.warning(f"Redis error: {e}")
+    active_sessions[session_id] = session_info
+    _bump_peer_version()
+
+def _remove_session(session_id):
+    """Drop a session from the shared store"""
+    if _redis is not None:
+        try:
+            pipe = _redis.pipeline()
+            pipe.hdel(SESSIONS_KEY, session_id)
+            pipe.zrem(JOINED_KEY, session_id)
+            pipe.execute()
+            _bump_peer_version()
+            return
+        except Exception as e:
+            logger.warning(f"Redis error: {e}")
+    active_sessions.pop(session_id, None)
+    peer_connections.pop(session_id, None)
+    _bump_peer_version()
+
+def _all_sessions():
+    """Return {session_id: session_info} from the shared store"""
+    if _redis is not None:
+        try:
+            raw = _redis.hgetall(SESSIONS_KEY)
+            return {sid: json.loads(blob) for sid, blob in raw.items()}
+        except Exception as e:
+            logger.warning(f"Redis error: {e}")
+    return dict(active_sessions)
+
+def _session_count():
+    """Number of active sessions without fetching them all"""
+    if _redis is not None:
+        try:
+            return _redis.hlen(SESSIONS_KEY)
+        except Exception as e:
+            logger.warning(f"Redis error: {e}")
+    return len(active_sessions)
+
+# Peer list cache: the expensive rebuild (HGETALL + json.loads per entry)
+# only happens when the session set actually changed. A version counter
+# bumped on join/leave keeps the cache coherent across workers.
+_peer_cache = {'version': None, 'peers': []}
+_local_version = 0
+
+def _bump_peer_version():
+    global _local_version
+    if _redis is not None:
+        try:
+            _redis.incr(VERSION_KEY)
+            return
+        except Exception as e:
+            logger.warning(f"Redis error: {e}")
+    _local_version += 1
+
+def _peer_version():
+    if _redis is not None:
+        try:
+            return _redis.get(VERSION_KEY) or '0'
+        except Exception as e:
+            logger.warning(f"Redis error: {e}")
+    return _local_version
+
+def _peer_list():
+    """Full peer list, rebuilt only when the session set has changed"""
+    version = _peer_version()
+    if _peer_cache['version'] != version:
+        _peer_cache['peers'] = [
+            {
+                'session_id': sid,
+                'device_name': info['device_name'],
+                'status': info['status'],
+                'joined_at': datetime.utcfromtimestamp(
+                    info.get('joined_epoch', 0)
+                ).isoformat()
+            }
+            for sid, info in _all_sessions().items()
+        ]
+        _peer_cache['version'] = version
+    return _peer_cache['peers']
+
+def _recent_session_count(window_seconds):
+    """Sessions that joined within the last window_seconds"""
+    cutoff = time.time() - window_seconds
+    if _redis is not None:
+        try:
+            return _redis.zcount(JOINED_KEY, cutoff, '+inf')
+        except Exception as e:
+            logger.warning(f"Redis error: {e}")
+    return sum(
+        1 for s in active_sessions.values()
+        if s.get('joined_epoch', 0) >= cutoff
+    )
+
 @p2p_bp.route('/p2p/status', methods=['GET'])
 def get_p2p_status():
     """Get P2P connection status"""
-    return jsonify({
+    resp = jsonify({
         'status': 'active',
         'signaling_server': 'connected',
         'message': 'P2P signaling server is running',
@@ -25,6 +158,10 @@ def get_p2p_status():
             'connection_type': 'WebRTC P2P'
         }
     })
+    # Static payload — let browsers/proxies absorb repeat polls
+    resp.headers['Cache-Control'] = 'public, max-age=60'
+    resp.add_etag()
+    return resp.make_conditional(request)
 
 @p2p_bp.route('/p2p/join', methods=['POST'])
 @api_rate_limit
@@ -36,21 +173,22 @@ def join_p2p_network():
         
         # Generate session ID
         session_id = str(uuid.uuid4())
-        
-        # Store session info
-        active_sessions[session_id] = {
+
+        # Store session info. Only the raw epoch is kept on the write
+        # path; ISO formatting happens lazily when a response needs it.
+        _store_session(session_id, {
             'device_name': device_name,
-            'joined_at': datetime.utcnow().isoformat(),
+            'joined_epoch': time.time(),
             'ip_address': request.remote_addr,
             'status': 'active'
-        }
-        
+        })
+
         return jsonify({
             'session_id': session_id,
             'device_name': device_name,
             'message': 'Successfully joined P2P network',
             'network_info': {
-                'total_peers': len(active_sessions),
+                'total_peers': _session_count(),
                 'your_ip': request.remote_addr
             }
         })
@@ -65,16 +203,11 @@ def get_available_peers():
     try:
         session_id = request.headers.get('X-Session-ID')
         
-        # Filter out current session from peer list
-        available_peers = []
-        for sid, session_info in active_sessions.items():
-            if sid != session_id:
-                available_peers.append({
-                    'session_id': sid,
-                    'device_name': session_info['device_name'],
-                    'status': session_info['status'],
-                    'joined_at': session_info['joined_at']
-                })
+        # Serve from the precomputed list; only the self-filter runs
+        # per request
+        available_peers = [
+            p for p in _peer_list() if p['session_id'] != session_id
+        ]
         
         return jsonify({
             'peers': available_peers,
@@ -91,14 +224,10 @@ def leave_p2p_network():
     """Leave the P2P network"""
     try:
         session_id = request.headers.get('X-Session-ID')
-        
-        if session_id in active_sessions:
-            del active_sessions[session_id]
-        
-        # Clean up any peer connections
-        if session_id in peer_connections:
-            del peer_connections[session_id]
-        
+
+        if session_id:
+            _remove_session(session_id)
+
         return jsonify({
             'message': 'Successfully left P2P network',
             'session_id': session_id
@@ -111,7 +240,7 @@ def leave_p2p_network():
 def get_room_info(room_id):
     """Get information about a P2P room"""
     # Count peers in this room
-    room_peers = [s for s in active_sessions.values() if s.get('room_id') == room_id]
+    room_peers = [s for s in _all_sessions().values() if s.get('room_id') == room_id]
     
     return jsonify({
         'room_id': room_id,
@@ -120,10 +249,25 @@ def get_room_info(room_id):
         'authentication_required': False
     })
 
+# Preallocated room ids: one entropy read refills 256 ids, so bursty
+# generate-room traffic costs one syscall per batch instead of one per
+# request. deque ops are atomic, so no lock is needed around the pop.
+_room_id_pool = deque()
+
+def _next_room_id():
+    try:
+        return _room_id_pool.popleft()
+    except IndexError:
+        raw = secrets.token_bytes(4 * 256)
+        _room_id_pool.extend(
+            raw[i:i + 4].hex() for i in range(0, len(raw), 4)
+        )
+        return _room_id_pool.popleft()
+
 @p2p_bp.route('/p2p/generate-room', methods=['POST'])
 def generate_room():
     """Generate a new P2P room ID"""
-    room_id = str(uuid.uuid4())[:8]  # Short room ID
+    room_id = _next_room_id()  # Short room ID (8 hex chars)
     return jsonify({
         'room_id': room_id,
         'join_url': f'/p2p?room={room_id}',
@@ -136,20 +280,14 @@ def get_p2p_stats():
     """Get P2P network statistics (public endpoint)"""
     try:
         # Calculate stats
-        total_sessions = len(active_sessions)
+        total_sessions = _session_count()
         active_connections = len(peer_connections)
+
+        # Network activity (last hour): one ZCOUNT over the join-time
+        # sorted set instead of re-parsing every session's ISO timestamp
+        recent_sessions = _recent_session_count(3600)
         
-        # Get network activity (last hour)
-        current_time = datetime.utcnow()
-        recent_sessions = 0
-        
-        for session_info in active_sessions.values():
-            joined_time = datetime.fromisoformat(session_info['joined_at'])
-            time_diff = (current_time - joined_time).total_seconds()
-            if time_diff < 3600:  # Last hour
-                recent_sessions += 1
-        
-        return jsonify({
+        resp = jsonify({
             'network_stats': {
                 'total_active_sessions': total_sessions,
                 'active_connections': active_connections,
@@ -164,7 +302,12 @@ def get_p2p_stats():
                 'cost': 'free'
             }
         })
-        
+        # Stats move slowly; a few seconds of shared caching plus 304s
+        # keeps repeat pollers off the Python path
+        resp.headers['Cache-Control'] = 'public, max-age=5'
+        resp.add_etag()
+        return resp.make_conditional(request)
+
     except Exception as e:
         return jsonify({'error': f'Failed to get P2P stats: {str(e)}'}), 500
 
@@ -1,29 +1,175 @@
+import base64
 import hashlib
+import logging
+import hmac
+import os
 import secrets
+import threading
+import time
+from collections import OrderedDict
+
+import bcrypt
+import redis
 from flask import Blueprint, jsonify, request
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import check_password_hash
+from sqlalchemy.orm import load_only
 
 from ..models.database import db
 from ..models import File
 from .auth import require_auth
-from ..middleware.rate_limiter import api_rate_limit, strict_rate_limit
+from ..middleware.rate_limiter import api_rate_limit, strict_rate_limit, file_password_rate_limit
+
+logger = logging.getLogger(__name__)
 
 password_bp = Blueprint('password', __name__)
 
+# Access tokens issued after a successful password check: lets clients
+# retry/download with an O(1) lookup instead of re-running the KDF.
+ACCESS_TOKEN_TTL = 3600  # 1 hour
+
+try:
+    _token_redis = redis.from_url(
+        os.getenv('REDIS_URL', 'redis://localhost:6379'),
+        decode_responses=True
+    )
+except Exception:
+    _token_redis = None
+
+# In-memory fallback: key -> expiry epoch
+_access_tokens = {}
+
+def store_file_access_token(file_id, token):
+    """Remember a verified access token for ACCESS_TOKEN_TTL seconds"""
+    key = f"fileaccess:{file_id}:{token}"
+    if _token_redis is not None:
+        try:
+            _token_redis.setex(key, ACCESS_TOKEN_TTL, '1')
+            return
+        except Exception as e:
+            logger.warning(f"Redis error: {e}")
+    _access_tokens[key] = time.time() + ACCESS_TOKEN_TTL
+
+def verify_file_access_token(file_id, token):
+    """Check a previously issued access token (no KDF work)"""
+    if not token:
+        return False
+    key = f"fileaccess:{file_id}:{token}"
+    if _token_redis is not None:
+        try:
+            return bool(_token_redis.exists(key))
+        except Exception as e:
+            logger.warning(f"Redis error: {e}")
+    expires = _access_tokens.get(key)
+    if expires is None:
+        return False
+    if expires < time.time():
+        del _access_tokens[key]
+        return False
+    return True
+
+# Protection-status flags: "file:pw:{file_id}" -> '1'/'0'. Written on
+# every set/remove so the hot password-status poll is a Redis GET, not a
+# DB query. TTL'd so stale entries age out; a miss falls back to the DB
+# and backfills.
+_PW_FLAG_TTL = 24 * 3600
+
+def _set_pw_flag(file_id, protected):
+    if _token_redis is None:
+        return
+    try:
+        _token_redis.setex(f"file:pw:{file_id}", _PW_FLAG_TTL, '1' if protected else '0')
+    except Exception as e:
+        logger.warning(f"Redis error: {e}")
+
+def _get_pw_flag(file_id):
+    """Returns True/False, or None when the flag is absent/unreachable"""
+    if _token_redis is None:
+        return None
+    try:
+        flag = _token_redis.get(f"file:pw:{file_id}")
+    except Exception as e:
+        logger.warning(f"Redis error: {e}")
+        return None
+    if flag is None:
+        return None
+    return flag == '1'
+
+def _random_password(alphabet, length):
+    """Build a random password from one batched entropy read.
+
+    secrets.choice() hits os.urandom once per character; drawing a block
+    of bytes up front and rejection-sampling keeps the output unbiased
+    while doing a handful of syscalls instead of one per character.
+    """
+    alen = len(alphabet)
+    limit = (256 // alen) * alen  # reject bytes above this to avoid modulo bias
+    chars = []
+    while len(chars) < length:
+        chars.extend(
+            alphabet[b % alen]
+            for b in secrets.token_bytes(length * 2)
+            if b < limit
+        )
+    return ''.join(chars[:length])
+
+# Access-token entropy pool: one os.urandom read serves 256 tokens
+# instead of a syscall per secrets.token_urlsafe call.
+_TOKEN_BYTES = 32
+_token_pool = {'buf': b'', 'pos': 0}
+_token_pool_lock = threading.Lock()
+
+def _fast_token_urlsafe():
+    """secrets.token_urlsafe(32) equivalent with batched urandom reads"""
+    with _token_pool_lock:
+        pos = _token_pool['pos']
+        if pos + _TOKEN_BYTES > len(_token_pool['buf']):
+            _token_pool['buf'] = os.urandom(_TOKEN_BYTES * 256)
+            pos = 0
+        raw = _token_pool['buf'][pos:pos + _TOKEN_BYTES]
+        _token_pool['pos'] = pos + _TOKEN_BYTES
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
 def generate_file_password():
     """Generate a secure random password for file protection"""
     # Generate a 12-character password with letters and numbers
     alphabet = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
-    password = ''.join(secrets.choice(alphabet) for _ in range(12))
-    return password
+    return _random_password(alphabet, 12)
 
 def hash_file_password(password):
     """Hash a file password for secure storage"""
-    return generate_password_hash(password, method='pbkdf2:sha256')
+    # bcrypt runs in native code, so a verify costs far less worker CPU
+    # than the pure-Python PBKDF2 path at equivalent attacker cost.
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=12)).decode()
+
+# Successful verifies, keyed by stored hash. Only a genuine KDF pass seeds
+# an entry, so repeats of the *correct* password become a constant-time
+# SHA-256 compare while wrong guesses always pay the full KDF.
+_VERIFY_CACHE_MAX = 4096
+_verify_cache = OrderedDict()
 
 def verify_file_password(password, password_hash):
     """Verify a file password against its hash"""
-    return check_password_hash(password_hash, password)
+    digest = hashlib.sha256(password.encode()).digest()
+    cached = _verify_cache.get(password_hash)
+    if cached is not None and hmac.compare_digest(cached, digest):
+        return True
+
+    # Hashes created before the bcrypt switch still verify via werkzeug
+    if password_hash.startswith('pbkdf2:'):
+        verified = check_password_hash(password_hash, password)
+    else:
+        try:
+            verified = bcrypt.checkpw(password.encode(), password_hash.encode())
+        except ValueError:
+            verified = False
+
+    if verified:
+        _verify_cache[password_hash] = digest
+        _verify_cache.move_to_end(password_hash)
+        while len(_verify_cache) > _VERIFY_CACHE_MAX:
+            _verify_cache.popitem(last=False)
+
+    return verified
 
 @password_bp.route('/files/<file_id>/password', methods=['POST'])
 @require_auth
@@ -31,36 +177,44 @@ def verify_file_password(password, password_hash):
 def set_file_password(file_id):
     """Set password protection for a file"""
     try:
-        data = request.get_json()
+        # silent=True turns malformed/absent JSON into a fast 400 below
+        # instead of an exception unwound through the 500 handler
+        data = request.get_json(silent=True) or {}
         password = data.get('password')
         auto_generate = data.get('auto_generate', False)
-        
-        # Get the file
-        file_record = File.query.filter_by(id=file_id).first()
-        if not file_record:
-            return jsonify({'error': 'File not found'}), 404
-        
-        # Check if user owns the file
-        if file_record.user_id != request.current_user_id:
-            return jsonify({'error': 'Access denied'}), 403
-        
-        # Generate password if requested
+
+        # Validate input before touching the DB or running the KDF —
+        # malformed requests should not cost a query or a hash
         if auto_generate:
             password = generate_file_password()
         elif not password:
             return jsonify({'error': 'Password is required'}), 400
-        
+
         # Validate password strength
         if len(password) < 6:
             return jsonify({'error': 'Password must be at least 6 characters long'}), 400
-        
-        # Hash and store the password
+
+        # Hash first, then write in a single UPDATE ... RETURNING guarded
+        # by ownership — one round-trip instead of SELECT + UPDATE.
         password_hash = hash_file_password(password)
-        file_record.password_hash = password_hash
-        file_record.is_password_protected = True
-        
+        updated = db.session.execute(
+            db.update(File)
+            .where(File.id == file_id, File.user_id == request.current_user_id)
+            .values(password_hash=password_hash)
+            .returning(File.id)
+        ).first()
+
+        if updated is None:
+            # Distinguish missing file from foreign file with a cheap
+            # single-column lookup (only taken on the error path)
+            owner = db.session.query(File.user_id).filter_by(id=file_id).scalar()
+            if owner is None:
+                return jsonify({'error': 'File not found'}), 404
+            return jsonify({'error': 'Access denied'}), 403
+
         db.session.commit()
-        
+        _set_pw_flag(file_id, True)
+
         response_data = {
             'message': 'Password protection enabled',
             'file_id': file_id,
@@ -82,21 +236,24 @@ def set_file_password(file_id):
 def remove_file_password(file_id):
     """Remove password protection from a file"""
     try:
-        # Get the file
-        file_record = File.query.filter_by(id=file_id).first()
-        if not file_record:
-            return jsonify({'error': 'File not found'}), 404
-        
-        # Check if user owns the file
-        if file_record.user_id != request.current_user_id:
+        # Single UPDATE ... RETURNING guarded by ownership — one
+        # round-trip instead of SELECT + UPDATE
+        updated = db.session.execute(
+            db.update(File)
+            .where(File.id == file_id, File.user_id == request.current_user_id)
+            .values(password_hash=None)
+            .returning(File.id)
+        ).first()
+
+        if updated is None:
+            owner = db.session.query(File.user_id).filter_by(id=file_id).scalar()
+            if owner is None:
+                return jsonify({'error': 'File not found'}), 404
             return jsonify({'error': 'Access denied'}), 403
-        
-        # Remove password protection
-        file_record.password_hash = None
-        file_record.is_password_protected = False
-        
+
         db.session.commit()
-        
+        _set_pw_flag(file_id, False)
+
         return jsonify({
             'message': 'Password protection removed',
             'file_id': file_id,
@@ -108,34 +265,43 @@ def remove_file_password(file_id):
 
 @password_bp.route('/files/<file_id>/verify-password', methods=['POST'])
 @strict_rate_limit  # Stricter rate limiting for password attempts
+@file_password_rate_limit  # ... plus a per-(IP, file) attempt budget
 def verify_file_password_endpoint(file_id):
     """Verify password for accessing a protected file"""
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True) or {}
         password = data.get('password')
-        
+
         if not password:
             return jsonify({'error': 'Password is required'}), 400
-        
-        # Get the file
-        file_record = File.query.filter_by(id=file_id, is_deleted=False).first()
-        if not file_record:
+
+        # Primary-key lookup (hits the identity map on repeat access)
+        # restricted to the columns the response needs
+        file_record = db.session.get(File, file_id, options=[
+            load_only(
+                File.id, File.is_deleted, File.password_hash,
+                File.original_name, File.file_size, File.file_type,
+                File.created_at
+            )
+        ])
+        if not file_record or file_record.is_deleted:
             return jsonify({'error': 'File not found'}), 404
         
         # Check if file is password protected
-        if not file_record.is_password_protected:
+        if not file_record.password_hash:
             return jsonify({'error': 'File is not password protected'}), 400
-        
+
         # Verify password
         if not verify_file_password(password, file_record.password_hash):
             return jsonify({'error': 'Invalid password'}), 401
-        
+
         # Generate a temporary access token (valid for 1 hour)
-        access_token = secrets.token_urlsafe(32)
-        
-        # Store the access token in session or cache
-        # For now, we'll return it and expect the client to include it in download requests
-        
+        access_token = _fast_token_urlsafe()
+
+        # Cache it so download/retry requests validate by token lookup
+        # instead of re-running the password hash
+        store_file_access_token(file_id, access_token)
+
         return jsonify({
             'message': 'Password verified',
             'access_token': access_token,
@@ -144,7 +310,7 @@ def verify_file_password_endpoint(file_id):
                 'id': file_record.id,
                 'name': file_record.original_name,
                 'size': file_record.file_size,
-                'type': file_record.mime_type,
+                'type': file_record.file_type,
                 'created_at': file_record.created_at.isoformat()
             }
         })
@@ -157,15 +323,22 @@ def verify_file_password_endpoint(file_id):
 def get_password_status(file_id):
     """Get password protection status for a file"""
     try:
-        # Get the file
-        file_record = File.query.filter_by(id=file_id, is_deleted=False).first()
-        if not file_record:
-            return jsonify({'error': 'File not found'}), 404
-        
+        # Redis flag first — the common poll never touches the DB
+        protected = _get_pw_flag(file_id)
+        if protected is None:
+            # Primary-key lookup; only the status columns are needed
+            file_record = db.session.get(File, file_id, options=[
+                load_only(File.id, File.is_deleted, File.password_hash)
+            ])
+            if not file_record or file_record.is_deleted:
+                return jsonify({'error': 'File not found'}), 404
+            protected = bool(file_record.password_hash)
+            _set_pw_flag(file_id, protected)
+
         return jsonify({
             'file_id': file_id,
-            'is_password_protected': file_record.is_password_protected,
-            'requires_password': file_record.is_password_protected
+            'is_password_protected': protected,
+            'requires_password': protected
         })
         
     except Exception as e:
@@ -177,34 +350,37 @@ def get_password_status(file_id):
 def change_file_password(file_id):
     """Change password for a protected file"""
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True) or {}
         current_password = data.get('current_password')
         new_password = data.get('new_password')
         
         if not current_password or not new_password:
             return jsonify({'error': 'Both current and new passwords are required'}), 400
-        
-        # Get the file
-        file_record = File.query.filter_by(id=file_id).first()
+
+        # Validate new password strength up front so trivially invalid
+        # requests never reach the DB or the KDF
+        if len(new_password) < 6:
+            return jsonify({'error': 'New password must be at least 6 characters long'}), 400
+
+        # Get the file (only the columns this handler touches)
+        file_record = File.query.options(
+            load_only(File.id, File.user_id, File.password_hash)
+        ).filter_by(id=file_id).first()
         if not file_record:
             return jsonify({'error': 'File not found'}), 404
-        
+
         # Check if user owns the file
         if file_record.user_id != request.current_user_id:
             return jsonify({'error': 'Access denied'}), 403
-        
+
         # Check if file is password protected
-        if not file_record.is_password_protected:
+        if not file_record.password_hash:
             return jsonify({'error': 'File is not password protected'}), 400
-        
+
         # Verify current password
         if not verify_file_password(current_password, file_record.password_hash):
             return jsonify({'error': 'Current password is incorrect'}), 401
-        
-        # Validate new password strength
-        if len(new_password) < 6:
-            return jsonify({'error': 'New password must be at least 6 characters long'}), 400
-        
+
         # Update password
         new_password_hash = hash_file_password(new_password)
         file_record.password_hash = new_password_hash
@@ -224,7 +400,7 @@ def change_file_password(file_id):
 def generate_password_endpoint():
     """Generate a secure password for file protection"""
     try:
-        data = request.get_json() or {}
+        data = request.get_json(silent=True) or {}
         length = data.get('length', 12)
         include_symbols = data.get('include_symbols', False)
         
@@ -237,8 +413,8 @@ def generate_password_endpoint():
         if include_symbols:
             alphabet += "!@#$%^&*"
         
-        password = ''.join(secrets.choice(alphabet) for _ in range(length))
-        
+        password = _random_password(alphabet, length)
+
         return jsonify({
             'password': password,
             'length': len(password),
@@ -1,8 +1,20 @@
 import os
 import hashlib
 import mimetypes
+import re
+
 import magic
-from flask import Blueprint, jsonify, request
+
+# Optional: BLAKE3 is severalfold faster than SHA-256 for internal
+# fingerprinting (dedup keys). SHA-256 stays the default because
+# reputation lookups interoperate with external services keyed on it.
+try:
+    import blake3
+except ImportError:
+    blake3 = None
+
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+from collections import OrderedDict
 from datetime import datetime, timedelta
 import requests
 import json
@@ -24,11 +36,32 @@ ALLOWED_MIME_TYPES = {
     'audio': ['audio/mp3', 'audio/wav', 'audio/ogg', 'audio/m4a']
 }
 
+# Flattened once at import; scan_for_malware previously rebuilt this list
+# (and scanned it linearly) on every upload
+_ALLOWED_MIME_SET = frozenset(
+    m for types in ALLOWED_MIME_TYPES.values() for m in types
+)
+
 BLOCKED_EXTENSIONS = [
     '.exe', '.bat', '.cmd', '.com', '.pif', '.scr', '.vbs', '.js', '.jar',
     '.app', '.deb', '.pkg', '.dmg', '.msi', '.run', '.sh', '.ps1'
 ]
 
+# frozenset for O(1) membership on the per-upload extension check
+_BLOCKED_EXT_SET = frozenset(BLOCKED_EXTENSIONS)
+
+def _file_ext(filename):
+    """Lowercased extension including the dot, '' when there isn't one.
+
+    Single C-level rpartition instead of the full os.path.splitext
+    machinery; dotfiles ('.bashrc') report no extension, matching
+    splitext.
+    """
+    head, sep, tail = filename.rpartition('.')
+    if not sep or not head:
+        return ''
+    return '.' + tail.lower()
+
 SUSPICIOUS_PATTERNS = [
     b'<script',
     b'javascript:',
@@ -40,15 +73,34 @@ SUSPICIOUS_PATTERNS = [
     b'window.location'
 ]
 
-def calculate_file_hash(file_content):
-    """Calculate SHA-256 hash of file content"""
-    return hashlib.sha256(file_content).hexdigest()
+# One compiled alternation scans for every suspicious pattern in a single
+# pass over the payload, instead of one full substring scan per pattern.
+_SUSPICIOUS_RE = re.compile(b'|'.join(re.escape(p) for p in SUSPICIOUS_PATTERNS))
+
+def calculate_file_hash(file_content, algo='sha256'):
+    """Calculate a content hash.
+
+    algo='sha256' (default) for anything that must interoperate with
+    external reputation services; algo='blake3' for internal-only
+    fingerprints where speed matters and blake3 is installed.
+    """
+    if algo == 'blake3' and blake3 is not None:
+        return 'blake3:' + blake3.blake3(file_content).hexdigest()
+    # hashlib binds OpenSSL's EVP SHA-256, which dispatches to the SHA-NI
+    # instructions at runtime on CPUs that have them. usedforsecurity=False
+    # marks this as a content fingerprint so FIPS-wrapped builds skip the
+    # policy shim. Feed a memoryview so large upload buffers are hashed in
+    # place instead of copied.
+    h = hashlib.new('sha256', usedforsecurity=False)
+    h.update(memoryview(file_content))
+    return h.hexdigest()
 
 def detect_mime_type(file_content, filename):
     """Detect MIME type using multiple methods"""
-    # Try python-magic first (more accurate)
+    # Try python-magic first (more accurate). Signatures are in the file
+    # header, so only the prefix needs to cross into libmagic.
     try:
-        mime_type = magic.from_buffer(file_content, mime=True)
+        mime_type = magic.from_buffer(file_content[:8192], mime=True)
         if mime_type:
             return mime_type
     except:
@@ -58,38 +110,56 @@ def detect_mime_type(file_content, filename):
     mime_type, _ = mimetypes.guess_type(filename)
     return mime_type or 'application/octet-stream'
 
-def scan_for_malware(file_content, filename):
-    """Basic malware scanning"""
+def scan_for_malware(file_content, filename, detected_mime=None):
+    """Basic malware scanning.
+
+    Callers that already sniffed the MIME type can pass it in via
+    detected_mime to avoid a second libmagic pass over the content.
+    """
     scan_results = {
         'is_safe': True,
         'threats_found': [],
         'scan_details': {}
     }
-    
-    # Check file extension
-    file_ext = os.path.splitext(filename)[1].lower()
-    if file_ext in BLOCKED_EXTENSIONS:
+
+    # O(1) rejections first: a blocked extension or oversize payload
+    # fails the scan regardless, so skip the O(N) content passes below
+    file_ext = _file_ext(filename)
+    if file_ext in _BLOCKED_EXT_SET:
         scan_results['is_safe'] = False
         scan_results['threats_found'].append(f'Blocked file extension: {file_ext}')
-    
-    # Check for suspicious patterns
-    for pattern in SUSPICIOUS_PATTERNS:
-        if pattern in file_content:
-            scan_results['is_safe'] = False
-            scan_results['threats_found'].append(f'Suspicious pattern detected: {pattern.decode("utf-8", errors="ignore")}')
-    
+
     # Check file size (basic DoS protection)
     if len(file_content) > 100 * 1024 * 1024:  # 100MB
         scan_results['is_safe'] = False
         scan_results['threats_found'].append('File size exceeds maximum allowed limit')
-    
+
+    if not scan_results['is_safe']:
+        scan_results['scan_details'] = {
+            'file_size': len(file_content),
+            'detected_mime_type': detected_mime,
+            'file_extension': file_ext,
+            'scan_timestamp': datetime.utcnow().isoformat()
+        }
+        return scan_results
+
+    # Check for suspicious patterns — single pass, stop early once every
+    # pattern has been seen
+    found_patterns = set()
+    for match in _SUSPICIOUS_RE.finditer(file_content):
+        found_patterns.add(match.group())
+        if len(found_patterns) == len(SUSPICIOUS_PATTERNS):
+            break
+    for pattern in SUSPICIOUS_PATTERNS:
+        if pattern in found_patterns:
+            scan_results['is_safe'] = False
+            scan_results['threats_found'].append(f'Suspicious pattern detected: {pattern.decode("utf-8", errors="ignore")}')
+
     # MIME type validation
-    detected_mime = detect_mime_type(file_content, filename)
-    allowed_types = []
-    for category, types in ALLOWED_MIME_TYPES.items():
-        allowed_types.extend(types)
-    
-    if detected_mime not in allowed_types:
+    if detected_mime is None:
+        detected_mime = detect_mime_type(file_content, filename)
+
+    if detected_mime not in _ALLOWED_MIME_SET:
         scan_results['is_safe'] = False
         scan_results['threats_found'].append(f'Unsupported file type: {detected_mime}')
     
@@ -102,6 +172,32 @@ def scan_for_malware(file_content, filename):
     
     return scan_results
 
+# Scan results keyed by content hash: a re-upload of identical bytes
+# (dedup case) returns the stored verdict instead of re-running the
+# pattern scan. Same OrderedDict-LRU shape as the password verify cache.
+_SCAN_CACHE_MAX = 10000
+_scan_cache = OrderedDict()
+
+def _cached_scan(file_hash, file_content, filename, detected_mime):
+    """scan_for_malware with an LRU keyed on the content hash.
+
+    The extension is part of the key because the verdict also depends on
+    the filename, not just the bytes.
+    """
+    key = (file_hash, _file_ext(filename))
+    cached = _scan_cache.get(key)
+    if cached is not None:
+        _scan_cache.move_to_end(key)
+        return cached
+
+    scan_results = scan_for_malware(
+        file_content, filename, detected_mime=detected_mime
+    )
+    _scan_cache[key] = scan_results
+    while len(_scan_cache) > _SCAN_CACHE_MAX:
+        _scan_cache.popitem(last=False)
+    return scan_results
+
 def check_file_reputation(file_hash):
     """Check file reputation against known databases"""
     # This is a placeholder for integration with services like VirusTotal
@@ -128,6 +224,11 @@ def check_file_reputation(file_hash):
 def scan_uploaded_file():
     """Scan an uploaded file for security threats"""
     try:
+        # Content-Length is free: refuse clearly-oversize bodies before
+        # buffering a single byte instead of after reading the payload
+        if request.content_length and request.content_length > 100 * 1024 * 1024:
+            return jsonify({'error': 'File size exceeds maximum allowed limit'}), 413
+
         if 'file' not in request.files:
             return jsonify({'error': 'No file provided'}), 400
         
@@ -135,31 +236,40 @@ def scan_uploaded_file():
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
         
-        # Read file content
+        # Read file content once; nothing re-reads the stream afterwards,
+        # and all downstream consumers take buffer-protocol objects, so
+        # this is the only full-size allocation on the endpoint
         file_content = file.read()
-        file.seek(0)  # Reset file pointer
-        
-        # Calculate file hash
+
+
+        # One pass each: hash once, sniff MIME once, and share both with
+        # the scan and the report instead of re-deriving them per section
         file_hash = calculate_file_hash(file_content)
-        
-        # Perform malware scan
-        scan_results = scan_for_malware(file_content, file.filename)
-        
+        detected_mime = detect_mime_type(file_content, file.filename)
+
+        # Perform malware scan (reusing the sniffed MIME type); identical
+        # content seen before answers from the hash-keyed cache
+        scan_results = _cached_scan(
+            file_hash, file_content, file.filename, detected_mime
+        )
+
         # Check file reputation
         reputation_data = check_file_reputation(file_hash)
-        
+
         # Combine results
         security_report = {
             'file_info': {
                 'filename': file.filename,
                 'size': len(file_content),
                 'hash': file_hash,
-                'mime_type': detect_mime_type(file_content, file.filename)
+                'mime_type': detected_mime
             },
             'malware_scan': scan_results,
             'reputation': reputation_data,
             'overall_safety': scan_results['is_safe'] and reputation_data['reputation_score'] > 50,
-            'scan_timestamp': datetime.utcnow().isoformat()
+            # One clock read per request — reuse the reputation timestamp
+            # instead of formatting utcnow again
+            'scan_timestamp': reputation_data['last_analysis']
         }
         
         return jsonify({
@@ -317,8 +427,12 @@ def get_security_audit_log():
         page = request.args.get('page', 1, type=int)
         per_page = min(request.args.get('per_page', 20, type=int), 100)
         
-        # Get user's files with security events
-        files_query = File.query.filter_by(user_id=user_id)
+        # Column projection: the loop below only formats a handful of
+        # fields, so fetch tuples instead of instantiating ORM objects
+        files_query = File.query.with_entities(
+            File.id, File.original_name, File.created_at,
+            File.file_size, File.file_type, File.password_hash
+        ).filter(File.user_id == user_id)
         
         # Filter by date range if provided
         start_date = request.args.get('start_date')
@@ -336,40 +450,49 @@ def get_security_audit_log():
             page=page, per_page=per_page, error_out=False
         )
         
-        audit_entries = []
-        for file in files.items:
-            entry = {
-                'file_id': file.id,
-                'filename': file.original_name,
+        audit_entries = [
+            {
+                'file_id': file_id,
+                'filename': original_name,
                 'event_type': 'upload',
-                'timestamp': file.created_at.isoformat(),
+                'timestamp': created_at.isoformat(),
                 'details': {
-                    'file_size': file.file_size,
-                    'mime_type': file.mime_type,
-                    'is_password_protected': file.is_password_protected
-                }
-            }
-            
-            # Add quarantine info if applicable
-            if getattr(file, 'is_quarantined', False):
-                entry['security_status'] = 'quarantined'
-                entry['quarantine_reason'] = getattr(file, 'quarantine_reason', '')
-            else:
-                entry['security_status'] = 'safe'
-            
-            audit_entries.append(entry)
-        
-        return jsonify({
-            'audit_log': audit_entries,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': files.total,
-                'pages': files.pages,
-                'has_next': files.has_next,
-                'has_prev': files.has_prev
+                    'file_size': file_size,
+                    'mime_type': file_type,
+                    'is_password_protected': bool(password_hash)
+                },
+                # No quarantine columns exist in the schema, so every
+                # entry reports safe (same result the getattr defaults
+                # produced before)
+                'security_status': 'safe'
             }
-        })
+            for file_id, original_name, created_at,
+                file_size, file_type, password_hash in files.items
+        ]
+        
+        pagination = {
+            'page': page,
+            'per_page': per_page,
+            'total': files.total,
+            'pages': files.pages,
+            'has_next': files.has_next,
+            'has_prev': files.has_prev
+        }
+
+        # Stream the array entry-by-entry: the response starts flowing
+        # after the first row instead of double-buffering the whole
+        # document as one Python string
+        dumps = current_app.json.dumps
+
+        def generate():
+            yield '{"audit_log":['
+            for i, entry in enumerate(audit_entries):
+                yield (',' if i else '') + dumps(entry)
+            yield '],"pagination":' + dumps(pagination) + '}'
+
+        return Response(
+            stream_with_context(generate()), mimetype='application/json'
+        )
         
     except Exception as e:
         return jsonify({'error': f'Audit log retrieval failed: {str(e)}'}), 500
@@ -449,13 +572,14 @@ def report_security_threat():
             return jsonify({'error': 'File not found'}), 404
         
         # Create threat report (in a real implementation, you'd have a ThreatReport model)
+        now = datetime.utcnow()
         threat_report = {
-            'id': f"threat_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}",
+            'id': f"threat_{now.strftime('%Y%m%d_%H%M%S')}",
             'file_id': file_id,
             'reported_by': request.current_user_id,
             'threat_type': threat_type,
             'description': description,
-            'reported_at': datetime.utcnow().isoformat(),
+            'reported_at': now.isoformat(),
             'status': 'pending_review'
         }
         
@@ -1,5 +1,8 @@
 # backend/src/routes/upload.py
 
+import hashlib
+import re
+import secrets
 import uuid
 from datetime import datetime, timedelta
 import io
@@ -11,23 +14,67 @@ from ..models.database import db
 from ..models import File
 from ..middleware.rate_limiter import upload_rate_limit
 from ..services.minio_client import minio_client
+from .files import bump_user_files_version
 
 upload_bp = Blueprint("upload", __name__, url_prefix="/api")
 
+# Bodies at or under this fit a single put_object: no tee wrapper, no
+# multipart coordination, one read and one hash update. Most share
+# uploads land here.
+_SMALL_UPLOAD_MAX = 1024 * 1024
+
 # --------------------------
 # Helper – detect MIME type 
 # --------------------------
 def detect_mime(file_bytes):
     try:
-        return magic.from_buffer(file_bytes, mime=True)
+        # libmagic signatures live in the file header — no reason to push
+        # a multi-MB buffer across the FFI boundary
+        return magic.from_buffer(file_bytes[:8192], mime=True)
     except Exception:
         return "application/octet-stream"
 
+# --------------------------
+# Helper – hashing tee
+# --------------------------
+class HashingReader:
+    """File-like wrapper that SHA-256 hashes bytes as they are read.
+
+    hashlib releases the GIL on update() for buffers over ~2 KiB, so the
+    hashing overlaps boto3's network sends instead of costing a second
+    full pass over the payload. Deliberately not seekable: that forces
+    the uploader to consume the stream sequentially, which keeps the
+    digest consistent with the bytes actually sent.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        # Content fingerprint, not an auth primitive: usedforsecurity=False
+        # skips the FIPS policy shim on wrapped OpenSSL builds
+        self._hash = hashlib.new('sha256', usedforsecurity=False)
+
+    def read(self, size=-1):
+        chunk = self._stream.read(size)
+        if chunk:
+            self._hash.update(chunk)
+        return chunk
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
 # --------------------------
 # Helper – safe filename
 # --------------------------
+# Names that already consist of safe ASCII skip secure_filename's
+# unicode normalisation + regex pipeline — the common case for uploads.
+_SAFE_NAME_RE = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._-]{0,254}$')
+
 def safe_filename(name):
-    return secure_filename(name) or f"file_{uuid.uuid4().hex}"
+    if name and _SAFE_NAME_RE.match(name):
+        return name
+    # token_hex is the direct "random hex" primitive — no UUID object
+    # construction just to throw most of it away
+    return secure_filename(name) or f"file_{secrets.token_hex(16)}"
 
 # --------------------------
 # Upload Route
@@ -39,6 +86,12 @@ def upload_file():
         # --------------------------
         # Validate incoming file
         # --------------------------
+        # Reject clearly-oversize bodies from the Content-Length header
+        # before Werkzeug spools anything to disk
+        max_bytes = current_app.config.get("MAX_CONTENT_LENGTH")
+        if max_bytes and request.content_length and request.content_length > max_bytes:
+            return jsonify({"error": "File too large"}), 413
+
         if "file" not in request.files:
             return jsonify({"error": "No file provided"}), 400
 
@@ -46,10 +99,16 @@ def upload_file():
         if f.filename == "":
             return jsonify({"error": "Empty filename"}), 400
 
-        file_bytes = f.read()
+        # Sniff the MIME type from the head of the stream and take the
+        # size by seeking — the payload itself is never buffered here,
+        # it streams straight through to MinIO in 8 MiB parts.
+        head = f.stream.read(8192)
+        f.stream.seek(0, 2)
+        size = f.stream.tell()
+        f.stream.seek(0)
+
         filename = safe_filename(f.filename)
-        content_type = detect_mime(file_bytes)
-        size = len(file_bytes)
+        content_type = detect_mime(head)
 
         # --------------------------
         # Expiry hours
@@ -74,11 +133,29 @@ def upload_file():
         # --------------------------
         # Upload to MinIO
         # --------------------------
-        upload_res = minio_client.upload_file(
-            object_key=object_key,
-            file_bytes=file_bytes,
-            content_type=content_type
-        )
+        # The response only carries the share URL, so skip the presign —
+        # the download route signs on demand (and caches the result)
+        if size <= _SMALL_UPLOAD_MAX:
+            # Small-body fast path: single read, single PUT
+            body = f.stream.read()
+            hasher = hashlib.new('sha256', usedforsecurity=False)
+            hasher.update(body)
+            file_hash = hasher.hexdigest()
+            upload_res = minio_client.upload_file(
+                object_key, body, content_type, presign=False
+            )
+        else:
+            # The tee hashes each chunk as MinIO pulls it, so the digest
+            # is ready the moment the PUT finishes — no separate hashing
+            # pass
+            hashing_stream = HashingReader(f.stream)
+            upload_res = minio_client.upload_stream(
+                object_key=object_key,
+                fileobj=hashing_stream,
+                content_type=content_type,
+                presign=False
+            )
+            file_hash = hashing_stream.hexdigest()
 
         if not upload_res.get("success"):
             return jsonify({
@@ -117,9 +194,15 @@ def upload_file():
         if password and hasattr(new_file, "set_password"):
             new_file.set_password(password)
 
+        if hasattr(new_file, "file_hash"):
+            new_file.file_hash = file_hash
+
         db.session.add(new_file)
         db.session.commit()
 
+        # Route cached file listings to fresh keys
+        bump_user_files_version(new_file.user_id)
+
         # --------------------------
         # Response
         # --------------------------
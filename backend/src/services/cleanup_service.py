@@ -1,23 +1,35 @@
+import heapq
 import os
-import schedule
 import time
 import threading
-from datetime import datetime, timedelta
-from sqlalchemy import and_
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import and_, case, func, update
 import logging
 
 from ..models.database import db
-from ..models import File, Download, User
+from ..models import File, Download, User, DeletionQueue
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Storage configuration is read once at import: these get consulted on
+# every deletion inside the sweep loops, and a mid-sweep env change
+# shouldn't reconfigure the backend under the scheduler thread
+_USE_R2 = os.getenv('USE_R2_STORAGE', 'false').lower() == 'true'
+_R2_ENDPOINT = os.getenv('R2_ENDPOINT_URL')
+_R2_BUCKET = os.getenv('R2_BUCKET_NAME')
+_UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', 'uploads')
+
 class CleanupService:
     def __init__(self, app=None):
         self.app = app
         self.scheduler_thread = None
         self.is_running = False
+        self._r2 = None
+        self._wake_event = threading.Event()
+        self._jobs = []
         
     def init_app(self, app):
         """Initialize the cleanup service with Flask app"""
@@ -30,14 +42,23 @@ class CleanupService:
             return
             
         self.is_running = True
-        
-        # Schedule cleanup tasks
-        schedule.every(1).hours.do(self._cleanup_expired_files)
-        schedule.every(6).hours.do(self._cleanup_orphaned_files)
-        schedule.every(1).days.do(self._cleanup_old_downloads)
-        schedule.every(1).days.do(self._cleanup_temp_files)
-        schedule.every(7).days.do(self._generate_cleanup_report)
-        
+        self._wake_event.clear()
+
+        # Absolute-deadline heap of (next_run, seq, interval, job): the
+        # scheduler thread sleeps until the next job is actually due
+        # instead of waking every minute to poll a schedule table
+        now = time.time()
+        self._jobs = []
+        for seq, (interval, job) in enumerate([
+            (1 * 3600, self._cleanup_expired_files),
+            (15 * 60, self._drain_deletion_queue),
+            (6 * 3600, self._cleanup_orphaned_files),
+            (24 * 3600, self._cleanup_old_downloads),
+            (24 * 3600, self._cleanup_temp_files),
+            (7 * 24 * 3600, self._generate_cleanup_report),
+        ]):
+            heapq.heappush(self._jobs, (now + interval, seq, interval, job))
+
         # Start scheduler thread
         self.scheduler_thread = threading.Thread(target=self._run_scheduler, daemon=True)
         self.scheduler_thread.start()
@@ -47,15 +68,26 @@ class CleanupService:
     def stop_scheduler(self):
         """Stop the cleanup scheduler"""
         self.is_running = False
-        schedule.clear()
+        # Wake the scheduler thread so it exits now, not at its next deadline
+        self._wake_event.set()
         logger.info("Cleanup scheduler stopped")
         
     def _run_scheduler(self):
-        """Run the scheduler loop"""
+        """Run the scheduler loop, sleeping until the next job deadline"""
         while self.is_running:
             try:
-                schedule.run_pending()
-                time.sleep(60)  # Check every minute
+                next_run, seq, interval, job = self._jobs[0]
+                delay = next_run - time.time()
+                if delay > 0:
+                    # Event.wait doubles as an interruptible sleep:
+                    # stop_scheduler sets it for a millisecond shutdown
+                    if self._wake_event.wait(timeout=delay):
+                        break
+                    continue
+                heapq.heapreplace(
+                    self._jobs, (time.time() + interval, seq, interval, job)
+                )
+                job()
             except Exception as e:
                 logger.error(f"Scheduler error: {str(e)}")
                 time.sleep(60)
@@ -67,38 +99,73 @@ class CleanupService:
                 current_time = datetime.utcnow()
                 
                 # Find expired files
-                expired_files = File.query.filter(
-                    and_(
+                # One bulk UPDATE ... RETURNING instead of hydrating every
+                # expired row into an ORM object and flushing N updates
+                stmt = (
+                    update(File)
+                    .where(and_(
                         File.expires_at <= current_time,
                         File.is_deleted == False
-                    )
-                ).all()
-                
-                cleanup_count = 0
-                storage_freed = 0
-                
-                for file in expired_files:
-                    try:
-                        # Delete from storage (R2/local)
-                        if self._delete_from_storage(file.storage_key):
-                            storage_freed += file.file_size
-                            
-                        # Mark as deleted in database
-                        file.is_deleted = True
-                        file.deleted_at = current_time
-                        cleanup_count += 1
-                        
-                    except Exception as e:
-                        logger.error(f"Failed to delete expired file {file.id}: {str(e)}")
-                        
+                    ))
+                    .values(is_deleted=True, deleted_at=current_time)
+                    .returning(File.id, File.storage_key, File.file_size)
+                )
+                rows = db.session.execute(stmt).all()
+
+                # Enqueue tombstones in the same local transaction — the
+                # commit never waits on a storage round-trip, and the
+                # drain job retries failed deletes instead of leaking them
+                if rows:
+                    db.session.bulk_insert_mappings(DeletionQueue, [
+                        {'storage_key': row.storage_key, 'requested_at': current_time}
+                        for row in rows
+                    ])
                 db.session.commit()
+
+                cleanup_count = len(rows)
+                storage_freed = sum(row.file_size for row in rows)
                 
                 if cleanup_count > 0:
-                    logger.info(f"Cleaned up {cleanup_count} expired files, freed {storage_freed / (1024*1024):.2f} MB")
+                    logger.info(f"Cleaned up {cleanup_count} expired files, queued {storage_freed / (1024*1024):.2f} MB for storage deletion")
                     
         except Exception as e:
             logger.error(f"Expired files cleanup failed: {str(e)}")
             
+    def _drain_deletion_queue(self):
+        """Delete queued storage objects in 1000-key batches"""
+        try:
+            with self.app.app_context():
+                while True:
+                    rows = DeletionQueue.query.order_by(
+                        DeletionQueue.requested_at
+                    ).limit(1000).all()
+
+                    if not rows:
+                        break
+
+                    deleted_keys = self._delete_many_from_storage(
+                        [row.storage_key for row in rows]
+                    )
+
+                    drained_ids = [
+                        row.id for row in rows
+                        if row.storage_key in deleted_keys
+                    ]
+                    if drained_ids:
+                        db.session.query(DeletionQueue).filter(
+                            DeletionQueue.id.in_(drained_ids)
+                        ).delete(synchronize_session=False)
+                        db.session.commit()
+                        logger.info(f"Drained {len(drained_ids)} queued storage deletions")
+
+                    if len(drained_ids) < len(rows):
+                        # Failed keys stay queued; retry them on the next
+                        # pass rather than spinning against a bad backend
+                        break
+
+        except Exception as e:
+            logger.error(f"Deletion queue drain failed: {str(e)}")
+
     def _cleanup_orphaned_files(self):
         """Remove files that exist in storage but not in database"""
         try:
@@ -114,40 +181,100 @@ class CleanupService:
                     )
                 ).all()
                 
+                # The per-key deletes are I/O-bound waits on storage
+                # round-trips, so overlap them across a thread pool (the
+                # cached boto3 client is thread-safe) and touch the
+                # session only from this thread once the pool drains
                 cleanup_count = 0
-                for file in deleted_files:
-                    try:
-                        if self._delete_from_storage(file.storage_key):
+                with ThreadPoolExecutor(max_workers=32) as executor:
+                    results = executor.map(
+                        lambda file: (file, self._delete_from_storage(file.storage_key)),
+                        deleted_files
+                    )
+                    for file, removed in results:
+                        if removed:
                             cleanup_count += 1
                             # Remove from database completely
                             db.session.delete(file)
-                    except Exception as e:
-                        logger.error(f"Failed to cleanup orphaned file {file.id}: {str(e)}")
-                        
+
                 db.session.commit()
-                
+
                 if cleanup_count > 0:
                     logger.info(f"Cleaned up {cleanup_count} orphaned files")
-                    
+
+                # True orphans: objects sitting in the bucket with no
+                # database row at all (failed uploads, lost commits)
+                if _USE_R2:
+                    orphan_count = self._sweep_storage_orphans()
+                    if orphan_count > 0:
+                        logger.info(f"Removed {orphan_count} orphaned storage objects")
+
         except Exception as e:
             logger.error(f"Orphaned files cleanup failed: {str(e)}")
+
+    def _sweep_storage_orphans(self):
+        """Delete storage objects that have no database row at all
+
+        Streams the bucket listing one 1000-key page at a time and
+        set-differences each page against the files table, so memory
+        stays bounded by a single page regardless of bucket size.
+        """
+        removed = 0
+        try:
+            r2_client = self._r2_client()
+            bucket_name = _R2_BUCKET
+
+            # Objects newer than this may belong to uploads whose DB row
+            # hasn't committed yet — leave them for the next pass
+            grace_cutoff = datetime.now(timezone.utc) - timedelta(hours=1)
+
+            paginator = r2_client.get_paginator('list_objects_v2')
+            for page in paginator.paginate(
+                Bucket=bucket_name, PaginationConfig={'PageSize': 1000}
+            ):
+                page_keys = {
+                    obj['Key'] for obj in page.get('Contents', [])
+                    if obj['LastModified'] < grace_cutoff
+                }
+                if not page_keys:
+                    continue
+
+                # Indexed lookup of the page's keys; soft-deleted rows
+                # still count as known so their purge pass owns them
+                known_keys = {
+                    key for (key,) in db.session.query(File.storage_key)
+                    .filter(File.storage_key.in_(page_keys))
+                }
+
+                orphans = page_keys - known_keys
+                if orphans:
+                    r2_client.delete_objects(
+                        Bucket=bucket_name,
+                        Delete={
+                            'Objects': [{'Key': key} for key in orphans],
+                            'Quiet': True
+                        }
+                    )
+                    removed += len(orphans)
+
+        except Exception as e:
+            logger.error(f"Orphan sweep failed: {str(e)}")
+
+        return removed
             
     def _cleanup_old_downloads(self):
         """Remove old download records to keep database clean"""
         try:
             with self.app.app_context():
-                # Remove download records older than 90 days
+                # Remove download records older than 90 days in one
+                # server-side DELETE — no ORM rows hydrated, no per-row
+                # flush. The created_at index keeps it a range scan.
                 cutoff_date = datetime.utcnow() - timedelta(days=90)
-                
-                old_downloads = Download.query.filter(
+
+                cleanup_count = db.session.query(Download).filter(
                     Download.created_at < cutoff_date
-                ).all()
-                
-                cleanup_count = len(old_downloads)
-                
-                for download in old_downloads:
-                    db.session.delete(download)
-                    
+                ).delete(synchronize_session=False)
+
                 db.session.commit()
                 
                 if cleanup_count > 0:
@@ -168,16 +295,20 @@ class CleanupService:
                     
                 # Remove files older than 24 hours
                 cutoff_time = time.time() - (24 * 60 * 60)
-                
-                for filename in os.listdir(temp_dir):
-                    if filename.startswith('sharesync_'):
-                        filepath = os.path.join(temp_dir, filename)
+
+                # scandir reuses metadata gathered while iterating the
+                # directory, and the name-first filter skips the stat for
+                # entries that can't match anyway
+                with os.scandir(temp_dir) as entries:
+                    for entry in entries:
+                        if not entry.name.startswith('sharesync_'):
+                            continue
                         try:
-                            if os.path.getmtime(filepath) < cutoff_time:
-                                os.remove(filepath)
+                            if entry.stat(follow_symlinks=False).st_mtime < cutoff_time:
+                                os.unlink(entry.path)
                                 cleanup_count += 1
-                        except Exception as e:
-                            logger.error(f"Failed to remove temp file {filepath}: {str(e)}")
+                        except OSError as e:
+                            logger.error(f"Failed to remove temp file {entry.path}: {str(e)}")
                             
             if cleanup_count > 0:
                 logger.info(f"Cleaned up {cleanup_count} temporary files")
@@ -190,33 +321,27 @@ class CleanupService:
         try:
             with self.app.app_context():
                 week_ago = datetime.utcnow() - timedelta(days=7)
-                
-                # Count files cleaned up in the last week
-                cleaned_files = File.query.filter(
-                    and_(
-                        File.is_deleted == True,
-                        File.deleted_at >= week_ago
-                    )
-                ).count()
-                
-                # Calculate storage freed
-                storage_freed = db.session.query(
-                    db.func.sum(File.file_size)
-                ).filter(
-                    and_(
-                        File.is_deleted == True,
-                        File.deleted_at >= week_ago
-                    )
-                ).scalar() or 0
-                
-                # Active files count
-                active_files = File.query.filter_by(is_deleted=False).count()
-                
-                # Total storage used
-                total_storage = db.session.query(
-                    db.func.sum(File.file_size)
-                ).filter_by(is_deleted=False).scalar() or 0
-                
+
+                # All four report figures come off the same table, so
+                # compute them with conditional aggregates in one scan
+                # instead of four separate round-trips
+                cleaned_recently = and_(
+                    File.is_deleted == True,
+                    File.deleted_at >= week_ago
+                )
+                row = db.session.query(
+                    func.sum(case((cleaned_recently, 1), else_=0)),
+                    func.sum(case((cleaned_recently, File.file_size), else_=0)),
+                    func.sum(case((File.is_deleted == False, 1), else_=0)),
+                    func.sum(case((File.is_deleted == False, File.file_size), else_=0)),
+                ).one()
+
+                cleaned_files = row[0] or 0
+                storage_freed = row[1] or 0
+                active_files = row[2] or 0
+                total_storage = row[3] or 0
+
+
                 report = {
                     'period': '7 days',
                     'files_cleaned': cleaned_files,
@@ -238,7 +363,7 @@ class CleanupService:
         """Delete file from storage (R2 or local)"""
         try:
             # If using Cloudflare R2
-            if os.getenv('USE_R2_STORAGE', 'false').lower() == 'true':
+            if _USE_R2:
                 return self._delete_from_r2(storage_key)
             else:
                 return self._delete_from_local(storage_key)
@@ -246,22 +371,76 @@ class CleanupService:
             logger.error(f"Storage deletion failed for {storage_key}: {str(e)}")
             return False
             
-    def _delete_from_r2(self, storage_key):
-        """Delete file from Cloudflare R2"""
+    def _delete_many_from_storage(self, storage_keys):
+        """Delete a batch of files from storage; returns the set of keys removed"""
+        if not storage_keys:
+            return set()
         try:
+            if _USE_R2:
+                return self._delete_many_from_r2(storage_keys)
+            return {key for key in storage_keys if self._delete_from_local(key)}
+        except Exception as e:
+            logger.error(f"Batch storage deletion failed: {str(e)}")
+            return set()
+
+    def _r2_client(self):
+        """Lazily build and cache the R2 client
+
+        Client construction loads botocore service models and a fresh
+        connection pool on every call; building it once keeps the TLS
+        session warm across deletions. botocore clients are thread-safe,
+        so the scheduler thread and manual cleanup can share it.
+        """
+        if self._r2 is None:
             import boto3
-            
-            # Initialize R2 client
-            r2_client = boto3.client(
+            from botocore.client import Config
+
+            self._r2 = boto3.client(
                 's3',
-                endpoint_url=os.getenv('R2_ENDPOINT_URL'),
+                endpoint_url=_R2_ENDPOINT,
                 aws_access_key_id=os.getenv('R2_ACCESS_KEY_ID'),
                 aws_secret_access_key=os.getenv('R2_SECRET_ACCESS_KEY'),
-                region_name='auto'
+                region_name='auto',
+                config=Config(
+                    max_pool_connections=50,
+                    retries={'max_attempts': 3}
+                )
             )
-            
-            bucket_name = os.getenv('R2_BUCKET_NAME')
-            
+        return self._r2
+
+    def _delete_many_from_r2(self, storage_keys):
+        """Delete files from Cloudflare R2 in 1000-key DeleteObjects batches"""
+        deleted = set()
+        try:
+            r2_client = self._r2_client()
+            bucket_name = _R2_BUCKET
+
+            # DeleteObjects accepts up to 1000 keys per call — one
+            # round-trip per 1000 files instead of one per file
+            for i in range(0, len(storage_keys), 1000):
+                batch = storage_keys[i:i + 1000]
+                response = r2_client.delete_objects(
+                    Bucket=bucket_name,
+                    Delete={
+                        'Objects': [{'Key': key} for key in batch],
+                        'Quiet': False
+                    }
+                )
+                deleted.update(obj['Key'] for obj in response.get('Deleted', []))
+                for error in response.get('Errors', []):
+                    logger.error(f"R2 batch deletion failed for {error.get('Key')}: {error.get('Message')}")
+
+        except Exception as e:
+            logger.error(f"R2 batch deletion failed: {str(e)}")
+
+        return deleted
+
+    def _delete_from_r2(self, storage_key):
+        """Delete file from Cloudflare R2"""
+        try:
+            r2_client = self._r2_client()
+            bucket_name = _R2_BUCKET
+
             # Delete object
             r2_client.delete_object(Bucket=bucket_name, Key=storage_key)
             return True
@@ -273,7 +452,7 @@ class CleanupService:
     def _delete_from_local(self, storage_key):
         """Delete file from local storage"""
         try:
-            upload_folder = os.getenv('UPLOAD_FOLDER', 'uploads')
+            upload_folder = _UPLOAD_FOLDER
             file_path = os.path.join(upload_folder, storage_key)
             
             if os.path.exists(file_path):
@@ -291,7 +470,8 @@ class CleanupService:
             with self.app.app_context():
                 if cleanup_type in ['all', 'expired']:
                     self._cleanup_expired_files()
-                    
+                    self._drain_deletion_queue()
+
                 if cleanup_type in ['all', 'orphaned']:
                     self._cleanup_orphaned_files()
                     
@@ -312,32 +492,29 @@ class CleanupService:
         """Get cleanup statistics"""
         try:
             with self.app.app_context():
-                # Files by status
-                active_files = File.query.filter_by(is_deleted=False).count()
-                deleted_files = File.query.filter_by(is_deleted=True).count()
-                
-                # Storage statistics
-                active_storage = db.session.query(
-                    db.func.sum(File.file_size)
-                ).filter_by(is_deleted=False).scalar() or 0
-                
-                # Expired files count
-                expired_files = File.query.filter(
-                    and_(
-                        File.expires_at <= datetime.utcnow(),
-                        File.is_deleted == False
-                    )
-                ).count()
-                
-                # Files expiring soon (next 24 hours)
-                expiring_soon = File.query.filter(
-                    and_(
-                        File.expires_at <= datetime.utcnow() + timedelta(hours=24),
-                        File.expires_at > datetime.utcnow(),
-                        File.is_deleted == False
-                    )
-                ).count()
-                
+                now = datetime.utcnow()
+                soon = now + timedelta(hours=24)
+
+                # Same conditional-aggregate fold as the weekly report:
+                # five figures, one table scan
+                active = File.is_deleted == False
+                row = db.session.query(
+                    func.sum(case((active, 1), else_=0)),
+                    func.sum(case((File.is_deleted == True, 1), else_=0)),
+                    func.sum(case((active, File.file_size), else_=0)),
+                    func.sum(case((and_(active, File.expires_at <= now), 1), else_=0)),
+                    func.sum(case(
+                        (and_(active, File.expires_at > now, File.expires_at <= soon), 1),
+                        else_=0
+                    )),
+                ).one()
+
+                active_files = row[0] or 0
+                deleted_files = row[1] or 0
+                active_storage = row[2] or 0
+                expired_files = row[3] or 0
+                expiring_soon = row[4] or 0
+
                 return {
                     'active_files': active_files,
                     'deleted_files': deleted_files,
@@ -2,12 +2,26 @@
 import os
 import logging
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.client import Config
 from botocore.exceptions import BotoCoreError, ClientError
 from urllib.parse import urljoin
 
 logger = logging.getLogger(__name__)
 
+# Stream uploads in 8 MiB parts so memory stays O(part) regardless of
+# file size and the PUT can start before the client finishes sending.
+# Parts go out over 16 threads; the source stream is still consumed
+# sequentially (it's non-seekable), so TLS and socket writes overlap
+# across parts while reads and hashing stay single-threaded.
+_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=16,
+    use_threads=True,
+    io_chunksize=1024 * 1024
+)
+
 class MinIOClient:
     def __init__(self, endpoint_url=None, access_key=None, secret_key=None, bucket_name=None, region=None):
         self.endpoint_url = endpoint_url or os.getenv("S3_ENDPOINT")
@@ -16,29 +30,88 @@ class MinIOClient:
         self.bucket_name = bucket_name or os.getenv("S3_BUCKET")
         self.region = region or os.getenv("S3_REGION", "us-east-1")
 
-        # Use signature v4 for compatibility
-        cfg = Config(signature_version='s3v4', region_name=self.region)
-        self.s3_client = boto3.client(
-            "s3",
-            endpoint_url=self.endpoint_url,
-            aws_access_key_id=self.access_key,
-            aws_secret_access_key=self.secret_key,
-            config=cfg
-        )
+        self._s3_client = None
+        self._bucket_checked = False
+
+    @property
+    def s3_client(self):
+        """Build the boto3 client on first use rather than at import.
+
+        Construction parses botocore service models and opens a fresh
+        connection pool — deferring it keeps worker cold start fast and
+        makes importing this module side-effect free.
+        """
+        if self._s3_client is None:
+            # Use signature v4 for compatibility. The pool is sized well
+            # above urllib3's default of 10 so concurrent transfers across
+            # worker threads don't serialize on checkout; bounded standard
+            # retries keep transient MinIO hiccups from surfacing as 500s.
+            cfg = Config(
+                signature_version='s3v4',
+                region_name=self.region,
+                max_pool_connections=100,
+                retries={'max_attempts': 3, 'mode': 'standard'},
+                # Path-style URLs (/{bucket}/{key}) — MinIO's default, and
+                # the nginx X-Accel offload forwards presigned paths as-is
+                s3={'addressing_style': 'path'}
+            )
+            self._s3_client = boto3.client(
+                "s3",
+                endpoint_url=self.endpoint_url,
+                aws_access_key_id=self.access_key,
+                aws_secret_access_key=self.secret_key,
+                config=cfg
+            )
+            # First build of the client: verify the bucket and install
+            # the lifecycle backstop before any transfer touches it
+            self.ensure_bucket()
+        return self._s3_client
 
     def ensure_bucket(self):
-        # Try to create bucket if not existing (idempotent)
+        # Try to create bucket if not existing (idempotent); once a check
+        # succeeds there's no reason to repeat the HeadBucket round-trip.
+        # Never fatal: an unreachable endpoint degrades to a warning and
+        # the next call retries.
+        if self._bucket_checked:
+            return
         try:
             self.s3_client.head_bucket(Bucket=self.bucket_name)
-        except ClientError:
+            self._bucket_checked = True
+        except (BotoCoreError, ClientError):
             try:
                 self.s3_client.create_bucket(Bucket=self.bucket_name)
-            except ClientError as e:
+                self._bucket_checked = True
+            except (BotoCoreError, ClientError) as e:
                 logger.warning("Could not create bucket: %s", e)
+        if self._bucket_checked:
+            self._ensure_lifecycle()
 
-    def upload_file(self, object_key, file_bytes, content_type="application/octet-stream"):
+    def _ensure_lifecycle(self):
+        # Server-side backstop: per-file expiry is enforced by the cleanup
+        # sweep (the database is the source of truth), but a lifecycle rule
+        # lets MinIO reap anything a missed sweep leaves behind. The longest
+        # share TTL is 7 days, so 8 is always past expiry.
+        try:
+            self.s3_client.put_bucket_lifecycle_configuration(
+                Bucket=self.bucket_name,
+                LifecycleConfiguration={
+                    'Rules': [{
+                        'ID': 'expire-stale-objects',
+                        'Status': 'Enabled',
+                        'Filter': {'Prefix': ''},
+                        'Expiration': {'Days': 8}
+                    }]
+                }
+            )
+        except (BotoCoreError, ClientError) as e:
+            logger.warning("Could not set lifecycle rule: %s", e)
+
+    def upload_file(self, object_key, file_bytes, content_type="application/octet-stream", presign=True):
         """
         Upload bytes and return dict { success, object_key, download_url (presigned) }
+
+        Pass presign=False when the caller won't use the URL — signing is
+        an HMAC pass per call and the download route presigns on demand.
         """
         try:
             self.s3_client.put_object(
@@ -47,22 +120,47 @@ class MinIOClient:
                 Body=file_bytes,
                 ContentType=content_type
             )
-            # Return a presigned GET URL (short-lived)
-            presigned = self.generate_presigned_url(
-                'get_object',
-                Params={'Bucket': self.bucket_name, 'Key': object_key},
-                ExpiresIn=3600
-            )
             return {
                 "success": True,
                 "object_key": object_key,
-                "download_url": presigned,
+                "download_url": self._presigned_get(object_key) if presign else None,
                 "content_type": content_type
             }
         except (BotoCoreError, ClientError) as e:
             logger.exception("upload_file failed: %s", e)
             return {"success": False, "error": str(e)}
 
+    def upload_stream(self, object_key, fileobj, content_type="application/octet-stream", presign=True):
+        """
+        Stream a file-like object and return the same dict shape as
+        upload_file, without buffering the payload in memory.
+        """
+        try:
+            self.s3_client.upload_fileobj(
+                fileobj,
+                self.bucket_name,
+                object_key,
+                ExtraArgs={"ContentType": content_type},
+                Config=_TRANSFER_CONFIG
+            )
+            return {
+                "success": True,
+                "object_key": object_key,
+                "download_url": self._presigned_get(object_key) if presign else None,
+                "content_type": content_type
+            }
+        except (BotoCoreError, ClientError) as e:
+            logger.exception("upload_stream failed: %s", e)
+            return {"success": False, "error": str(e)}
+
+    def _presigned_get(self, object_key):
+        # Short-lived GET URL for upload responses that want one
+        return self.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': self.bucket_name, 'Key': object_key},
+            ExpiresIn=3600
+        )
+
     def generate_presigned_url(self, ClientMethod, Params, ExpiresIn=3600):
         try:
             return self.s3_client.generate_presigned_url(ClientMethod, Params=Params, ExpiresIn=ExpiresIn)
@@ -70,6 +168,31 @@ class MinIOClient:
             logger.exception("generate_presigned_url failed: %s", e)
             raise
 
+    def delete_files(self, object_keys):
+        """
+        Batch-delete objects: one DeleteObjects request per 1000 keys
+        instead of one round-trip per object.
+        Returns {"success", "deleted": [keys], "errors": [per-key dicts]}.
+        """
+        deleted, errors = [], []
+        keys = list(object_keys)
+        try:
+            for i in range(0, len(keys), 1000):
+                batch = keys[i:i + 1000]
+                resp = self.s3_client.delete_objects(
+                    Bucket=self.bucket_name,
+                    Delete={
+                        "Objects": [{"Key": k} for k in batch],
+                        "Quiet": False
+                    }
+                )
+                deleted.extend(d["Key"] for d in resp.get("Deleted", []))
+                errors.extend(resp.get("Errors", []))
+            return {"success": not errors, "deleted": deleted, "errors": errors}
+        except (BotoCoreError, ClientError) as e:
+            logger.exception("delete_files failed: %s", e)
+            return {"success": False, "deleted": deleted, "errors": [{"Message": str(e)}]}
+
     def delete_file(self, object_key):
         try:
             self.s3_client.delete_object(Bucket=self.bucket_name, Key=object_key)